@@ -0,0 +1,32 @@
+"""
+Measures the Bus.send latency with 1, 10 and 100 receivers.
+
+    make benchmark
+"""
+
+import timeit
+
+from tomate.pomodoro import Bus, Events
+
+NUMBER = 100_000
+
+
+def create_receiver():
+    def receiver(_, payload=None):
+        return payload
+
+    return receiver
+
+
+def main():
+    for receivers in (1, 10, 100):
+        bus = Bus()
+        for _ in range(receivers):
+            bus.connect(Events.TIMER_UPDATE, create_receiver())
+
+        elapsed = timeit.timeit(lambda: bus.send(Events.TIMER_UPDATE, payload=None), number=NUMBER)
+        print("send receivers={:>3} {:>8.3f} us".format(receivers, elapsed / NUMBER * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures the overhead of calling an @on handler through the Bus, comparing the
+previous generator based wrapper with the current direct call.
+
+    make benchmark
+"""
+
+import functools
+import timeit
+
+from tomate.pomodoro import Bus, Events, Subscriber, on
+
+NUMBER = 100_000
+
+
+def legacy_on(*events: Events):
+    def wrapper(method):
+        method._events = events
+
+        @functools.wraps(method)
+        def wrapped(*args, **kwargs):
+            return method(*(arg for arg in args if not isinstance(arg, Events)), **kwargs)
+
+        return wrapped
+
+    return wrapper
+
+
+class Legacy:
+    @legacy_on(Events.TIMER_UPDATE)
+    def on_timer_update(self, payload=None):
+        return payload
+
+
+class Current(Subscriber):
+    @on(Events.TIMER_UPDATE)
+    def on_timer_update(self, payload=None):
+        return payload
+
+
+def main():
+    legacy = Legacy().on_timer_update
+    elapsed = timeit.timeit(lambda: legacy(Events.TIMER_UPDATE, payload=None), number=NUMBER)
+    print("handler before {:>8.3f} us".format(elapsed / NUMBER * 1e6))
+
+    bus = Bus()
+    Current().connect(bus)
+    handler = bus._dispatch[Events.TIMER_UPDATE][0]
+    elapsed = timeit.timeit(lambda: handler(payload=None), number=NUMBER)
+    print("handler after  {:>8.3f} us".format(elapsed / NUMBER * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Measures connecting and disconnecting a plugin to the Bus 1000 times.
+
+    make benchmark
+"""
+
+import timeit
+
+from tomate.pomodoro import Bus, Events, Plugin, on
+
+NUMBER = 1000
+
+
+class BenchmarkPlugin(Plugin):
+    @on(Events.TIMER_UPDATE)
+    def on_timer_update(self, **__):
+        pass
+
+    @on(Events.SESSION_START, Events.SESSION_INTERRUPT, Events.SESSION_END)
+    def on_session_change(self, **__):
+        pass
+
+
+def main():
+    bus = Bus()
+    plugin = BenchmarkPlugin()
+
+    def toggle():
+        plugin.connect(bus)
+        plugin.disconnect(bus)
+
+    elapsed = timeit.timeit(toggle, number=NUMBER)
+    print("connect+disconnect x{} {:>8.3f} ms".format(NUMBER, elapsed * 1e3))
+
+
+if __name__ == "__main__":
+    main()
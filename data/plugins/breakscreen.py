@@ -12,6 +12,7 @@ from gi.repository import Gdk, GLib, Gtk
 
 import tomate.pomodoro.plugin as plugin
 from tomate.pomodoro import (
+    Bus,
     Config,
     ConfigPayload,
     Events,
@@ -51,17 +52,40 @@ class Monitor(namedtuple("Monitor", "number geometry")):
 
 
 class BreakScreen(Subscriber):
-    def __init__(self, monitor: Monitor, session: Session, config: Config):
+    def __init__(self, monitor: Monitor, session: Session, config: Config, timer: Timer):
         logger.debug("action=init_screen monitor=%s", monitor)
 
         self.monitor = monitor
         self.session = session
+        self.timer = timer
+        self.bus = None
         self.options = self.create_options(config)
         self.countdown = Gtk.Label(label="00:00", name="countdown")
         self.skip_button = self.create_button()
         content = self.create_content_area(self.countdown, self.skip_button)
         self.widget = self.create_window(self.monitor, content)
 
+    def connect(self, bus: Bus) -> None:
+        super().connect(bus)
+        self.bus = bus
+
+    def disconnect(self, bus: Bus) -> None:
+        self.hide()
+        super().disconnect(bus)
+        self.bus = None
+
+    def show(self, countdown: str) -> None:
+        # the countdown only follows the timer while the screen is shown
+        self.countdown.set_text(countdown)
+        self.bus.connect(Events.TIMER_UPDATE, self.on_timer_update)
+        self.widget.show_all()
+        # without receivers the timer wakes up once a minute, it goes back to one update a second
+        self.timer.refresh()
+
+    def hide(self) -> None:
+        self.bus.disconnect(Events.TIMER_UPDATE, self.on_timer_update)
+        self.widget.hide()
+
     def create_options(self, config) -> Dict[str, bool]:
         return {
             SKIP_BREAK_OPTION: config.get_bool(SECTION_NAME, SKIP_BREAK_OPTION, fallback=False),
@@ -114,13 +138,12 @@ class BreakScreen(Subscriber):
         logger.debug("action=session_start monitor=%d session=%s", self.monitor.number, payload.type)
 
         if payload.type != SessionType.POMODORO:
-            self.countdown.set_text(payload.countdown)
-            self.widget.show_all()
+            self.show(payload.countdown)
 
     @on(Events.SESSION_INTERRUPT)
     def on_session_interrupt(self, **__) -> None:
         logger.debug("action=session_start monitor=%d", self.monitor.number)
-        self.widget.hide()
+        self.hide()
 
     @on(Events.SESSION_END)
     def on_session_end(self, payload: SessionPayload) -> None:
@@ -134,7 +157,7 @@ class BreakScreen(Subscriber):
         if payload.type == SessionType.POMODORO and self.auto_start:
             GLib.timeout_add_seconds(Timer.ONE_SECOND, self._start_session)
         else:
-            self.widget.hide()
+            self.hide()
 
     def _start_session(self) -> bool:
         self.session.start()
@@ -144,23 +167,27 @@ class BreakScreen(Subscriber):
     def auto_start(self) -> bool:
         return self.options[AUTO_START_OPTION]
 
-    @on(Events.TIMER_UPDATE)
     def on_timer_update(self, payload: TimerPayload) -> None:
         logger.debug("action=update_countdown monitor=%s countdown=%s", payload.countdown, self.monitor.number)
         self.countdown.set_text(payload.countdown)
 
     @on(Events.CONFIG_CHANGE)
     def on_settings_change(self, payload: ConfigPayload) -> None:
-        if payload.section != SECTION_NAME:
+        if not payload.touches(SECTION_NAME):
             return
 
-        logger.debug(
-            "action=change_option monitor=%d config=%s option=%s",
-            self.monitor.number,
-            payload.action,
-            payload.option,
-        )
-        self.options[payload.option] = payload.action == "set"
+        for change in payload.changes:
+            if change.section != SECTION_NAME:
+                continue
+
+            logger.debug(
+                "action=change_option monitor=%d config=%s option=%s",
+                self.monitor.number,
+                change.action,
+                change.option,
+            )
+            self.options[change.option] = change.action == "set"
+
         self.skip_button.props.visible = self.options[SKIP_BREAK_OPTION]
 
 
@@ -220,9 +247,10 @@ class BreakScreenPlugin(plugin.Plugin):
     has_settings = True
 
     @suppress_errors
-    def __init__(self, display=Gdk.Display.get_default()):
+    def __init__(self, display=None):
         super().__init__()
-        self.display = display
+        # the module can be imported outside the main thread, the display is only looked up here
+        self.display = display or Gdk.Display.get_default()
         self.screens = []
         self.configure_style()
 
@@ -270,7 +298,10 @@ class BreakScreenPlugin(plugin.Plugin):
         for monitor in range(self.display.get_n_monitors()):
             geometry = self.display.get_monitor(monitor).get_geometry()
             screen = BreakScreen(
-                Monitor(monitor, geometry), self.graph.get("tomate.session"), self.graph.get("tomate.config")
+                Monitor(monitor, geometry),
+                self.graph.get("tomate.session"),
+                self.graph.get("tomate.config"),
+                self.graph.get("tomate.timer"),
             )
             screen.connect(self.bus)
             self.screens.append(screen)
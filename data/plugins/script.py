@@ -1,19 +1,31 @@
+import contextlib
 import locale
 import logging
-import subprocess
+import os
+import signal
+import tempfile
+from collections import deque, namedtuple
 from locale import gettext as _
 from string import Template
-from typing import Dict, Optional
+from typing import Deque, Dict, Optional, Tuple
 
 import gi
 from wiring import Graph
 
 gi.require_version("Gtk", "3.0")
 
-from gi.repository import Gtk
+from gi.repository import Gio, GLib, Gtk
 
 import tomate.pomodoro.plugin as plugin
-from tomate.pomodoro import Bus, Config, Events, SessionPayload, on, suppress_errors
+from tomate.pomodoro import (
+    Bus,
+    Config,
+    Events,
+    SessionPayload,
+    SessionType,
+    on,
+    suppress_errors,
+)
 
 locale.textdomain("tomate")
 logger = logging.getLogger(__name__)
@@ -22,6 +34,19 @@ SECTION_NAME = "script_plugin"
 START_OPTION = "start_command"
 STOP_OPTION = "stop_command"
 FINISH_OPTION = "finish_command"
+TIMEOUT_OPTION = "timeout"
+MAX_RUNNING_OPTION = "max_running"
+
+
+class Payload(namedtuple("ScriptPayload", "event session command status stdout stderr timed_out")):
+    """
+    Sent with SCRIPT_EXIT when a command finishes. The status is the exit code, or minus the signal number when the
+    command was killed.
+    """
+
+    @property
+    def success(self) -> bool:
+        return self.status == 0
 
 
 def strip_space(command: Optional[str]) -> Optional[str]:
@@ -29,49 +54,174 @@ def strip_space(command: Optional[str]) -> Optional[str]:
         return command.strip()
 
 
+class Script:
+    def __init__(self, command: str, event: Events, session: SessionType):
+        self.command = command
+        self.event = event
+        self.session = session
+        self.process: Optional[Gio.Subprocess] = None
+        self.pid = 0
+        self.timeout = 0
+        self.timed_out = False
+        # the output goes to files, programs left in the background can keep them open after the command exits
+        self.stdout_path = self.stderr_path = ""
+
+    def read_output(self) -> Tuple[str, str]:
+        return read_and_remove(self.stdout_path), read_and_remove(self.stderr_path)
+
+
+def create_output_file() -> str:
+    fd, path = tempfile.mkstemp(prefix="tomate-script-")
+    os.close(fd)
+    return path
+
+
+def read_and_remove(path: str) -> str:
+    if not path:
+        return ""
+
+    try:
+        with open(path, errors="replace") as output:
+            return output.read()
+    except OSError:
+        return ""
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+
+
 class ScriptPlugin(plugin.Plugin):
+    """
+    Runs the commands in the background, at most max_running at a time and in the order of the events. A command ends
+    when its shell exits, the programs it leaves in the background keep running. A shell still running after timeout
+    seconds is killed with its process group, each command sends a SCRIPT_EXIT with its exit status and output.
+    """
+
     has_settings = True
+    TIMEOUT = 60
+    MAX_RUNNING = 1
 
     @suppress_errors
     def __init__(self):
         super().__init__()
         self.config = None
+        self.queue: Deque[Script] = deque()
+        self.running = 0
 
     def configure(self, bus: Bus, graph: Graph) -> None:
         super().configure(bus, graph)
         self.config = graph.get("tomate.config")
 
+    def deactivate(self) -> None:
+        # the running commands finish, the waiting ones are dropped
+        self.queue.clear()
+        super().deactivate()
+
     @suppress_errors
     @on(Events.SESSION_START)
-    def on_session_started(self, payload: SessionPayload):
-        return self.call_command(START_OPTION, Events.SESSION_START, payload)
+    def on_session_started(self, payload: SessionPayload) -> None:
+        self.call_command(START_OPTION, Events.SESSION_START, payload)
 
     @suppress_errors
     @on(Events.SESSION_INTERRUPT)
-    def on_session_interrupted(self, payload: SessionPayload):
-        return self.call_command(STOP_OPTION, Events.SESSION_INTERRUPT, payload)
+    def on_session_interrupted(self, payload: SessionPayload) -> None:
+        self.call_command(STOP_OPTION, Events.SESSION_INTERRUPT, payload)
 
     @suppress_errors
     @on(Events.SESSION_END)
-    def on_session_end(self, payload: SessionPayload):
-        return self.call_command(FINISH_OPTION, Events.SESSION_END, payload)
+    def on_session_end(self, payload: SessionPayload) -> None:
+        self.call_command(FINISH_OPTION, Events.SESSION_END, payload)
 
-    def call_command(self, section, event: Events, payload: SessionPayload):
-        command = self.read_command(section, {"event": event.name, "session": payload.type.name})
+    def call_command(self, option: str, event: Events, payload: SessionPayload) -> None:
+        command = self.read_command(option, {"event": event.name, "session": payload.type.name})
         if command:
-            try:
-                logger.debug("action=call-command cmd=%s", command)
-                subprocess.run(command, shell=True, check=True)
-                return True
-            except subprocess.CalledProcessError as error:
-                logger.debug(
-                    "action=run-command-failed event=%s cmd=%s output=%s return-code=%s",
-                    event,
-                    error.cmd,
-                    error.output,
-                    error.returncode,
-                )
-        return False
+            self.queue.append(Script(command, event, payload.type))
+            self.run_next()
+
+    def run_next(self) -> None:
+        max_running = self.config.get_int(SECTION_NAME, MAX_RUNNING_OPTION, fallback=self.MAX_RUNNING)
+        while self.queue and self.running < max(max_running, 1):
+            self.spawn(self.queue.popleft())
+
+    def spawn(self, script: Script) -> None:
+        logger.debug("action=call-command cmd=%s", script.command)
+        script.stdout_path, script.stderr_path = create_output_file(), create_output_file()
+        launcher = Gio.SubprocessLauncher.new(Gio.SubprocessFlags.NONE)
+        launcher.set_stdout_file_path(script.stdout_path)
+        launcher.set_stderr_file_path(script.stderr_path)
+        try:
+            # setsid starts the shell in its own process group, the timeout kills the programs it started too
+            script.process = launcher.spawnv(["setsid", "/bin/sh", "-c", script.command])
+        except GLib.Error as error:
+            logger.error("action=call-command-failed cmd=%s error=%s", script.command, error.message)
+            script.read_output()
+            self.bus.emit(Events.SCRIPT_EXIT, self.payload(script, -1, "", error.message))
+            return
+
+        self.running += 1
+        script.pid = int(script.process.get_identifier())
+        timeout = self.config.get_int(SECTION_NAME, TIMEOUT_OPTION, fallback=self.TIMEOUT)
+        if timeout > 0:
+            script.timeout = GLib.timeout_add_seconds(timeout, self.on_timeout, script)
+        # the command is done when the shell exits, the programs it left in the background keep running
+        script.process.wait_async(None, self.on_exit, script)
+
+    def on_timeout(self, script: Script) -> bool:
+        script.timeout = 0
+        # the shell was reaped, its exit is about to be handled
+        if script.process.get_identifier() is None:
+            return GLib.SOURCE_REMOVE
+
+        logger.warning("action=kill-command cmd=%s", script.command)
+        script.timed_out = True
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(script.pid, signal.SIGKILL)
+        return GLib.SOURCE_REMOVE
+
+    def on_exit(self, process: Gio.Subprocess, result: Gio.AsyncResult, script: Script) -> None:
+        self.running -= 1
+        if script.timeout:
+            GLib.source_remove(script.timeout)
+            script.timeout = 0
+
+        try:
+            process.wait_finish(result)
+        except GLib.Error as error:
+            logger.error("action=command-wait-failed cmd=%s error=%s", script.command, error.message)
+
+        stdout, stderr = script.read_output()
+        if process.get_if_exited():
+            status = process.get_exit_status()
+        else:
+            status = -process.get_term_sig()
+
+        payload = self.payload(script, status, stdout or "", stderr or "")
+        if payload.success:
+            logger.debug("action=command-exit cmd=%s stdout=%s", script.command, payload.stdout)
+        else:
+            logger.warning(
+                "action=command-failed event=%s cmd=%s status=%d timed-out=%s stderr=%s",
+                script.event,
+                script.command,
+                status,
+                script.timed_out,
+                payload.stderr,
+            )
+
+        self.bus.emit(Events.SCRIPT_EXIT, payload)
+        self.run_next()
+
+    @staticmethod
+    def payload(script: Script, status: int, stdout: str, stderr: str) -> Payload:
+        return Payload(
+            event=script.event,
+            session=script.session,
+            command=script.command,
+            status=status,
+            stdout=stdout,
+            stderr=stderr,
+            timed_out=script.timed_out,
+        )
 
     def read_command(self, section: str, repl: Dict[str, str]) -> Optional[str]:
         template = strip_space(self.config.get(SECTION_NAME, section))
@@ -41,6 +41,7 @@ def config(bus, tmpdir) -> Config:
     cfg = Config(bus)
     tmp_path = tmpdir.mkdir("tomate").join("tomate.config")
     cfg.config_path = lambda: tmp_path.strpath
+    cfg.cache_path = lambda name: tmp_path.dirpath(name).strpath
     return cfg
 
 
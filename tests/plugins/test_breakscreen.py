@@ -8,7 +8,7 @@ gi.require_version("Gtk", "3.0")
 
 from gi.repository import Gtk
 
-from tomate.pomodoro import ConfigPayload, Events, SessionType, TimerPayload
+from tomate.pomodoro import ConfigPayload, Events, SessionType, Timer, TimerPayload
 from tomate.ui.testing import Q, create_session_payload, run_loop_for
 
 SECTION_NAME = "break_screen"
@@ -22,6 +22,7 @@ def plugin(bus, config, graph, session):
     graph.register_instance("tomate.bus", bus)
     graph.register_instance("tomate.config", config)
     graph.register_instance("tomate.session", session)
+    graph.register_instance("tomate.timer", Timer(bus, config))
 
     from breakscreen import BreakScreenPlugin
 
@@ -118,6 +119,7 @@ class TestPlugin:
 
     def test_updates_countdown(self, bus, plugin):
         plugin.activate()
+        bus.send(Events.SESSION_START, payload=create_session_payload(type=SessionType.SHORT_BREAK))
 
         time_left = random.randint(1, 100)
 
@@ -126,6 +128,31 @@ class TestPlugin:
 
         assert label_text(payload.countdown, plugin)
 
+    def test_rearms_the_timer_when_shown_in_the_middle_of_a_session(self, bus, graph, mocker, plugin):
+        timeout_add = mocker.patch("tomate.pomodoro.timer.GLib.timeout_add", return_value=1)
+        mocker.patch("tomate.pomodoro.timer.GLib.source_remove")
+        timer = graph.get("tomate.timer")
+        plugin.activate()
+
+        timer.start(5 * 60)
+        assert timeout_add.call_args.args[0] == Timer.IDLE_WAKE_UP
+
+        bus.send(Events.SESSION_START, payload=create_session_payload(type=SessionType.SHORT_BREAK))
+
+        # the clock moved a few milliseconds since the start
+        assert timeout_add.call_args.args[0] <= 1000
+        assert label_text("05:00", plugin)
+
+    def test_receives_timer_updates_only_while_shown(self, bus, plugin):
+        plugin.activate()
+        assert bus.has_receivers(Events.TIMER_UPDATE) is False
+
+        bus.send(Events.SESSION_START, payload=create_session_payload(type=SessionType.SHORT_BREAK))
+        assert bus.has_receivers(Events.TIMER_UPDATE) is True
+
+        bus.send(Events.SESSION_END, payload=create_session_payload(type=SessionType.SHORT_BREAK))
+        assert bus.has_receivers(Events.TIMER_UPDATE) is False
+
     @pytest.mark.parametrize(
         "action,option,initial,value,want",
         [
@@ -159,6 +186,17 @@ class TestPlugin:
 
         assert all([screen.skip_button.props.visible == want for screen in plugin.screens])
 
+    def test_updates_all_options_changed_in_a_transaction(self, config, plugin):
+        plugin.activate()
+
+        with config.transaction():
+            config.set(SECTION_NAME, AUTO_START_OPTION, "true")
+            config.set(SECTION_NAME, SKIP_BREAK_OPTION, "true")
+
+        for screen in plugin.screens:
+            assert screen.options == {AUTO_START_OPTION: True, SKIP_BREAK_OPTION: True}
+            assert screen.skip_button.props.visible is True
+
 
 class TestSettingsWindow:
     def test_options_labels(self, plugin):
@@ -1,4 +1,4 @@
-import subprocess
+import time
 
 import gi
 import pytest
@@ -8,20 +8,11 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 
 from tomate.pomodoro import Events, SessionType
-from tomate.ui.testing import Q, create_session_payload
+from tomate.ui.testing import Q, create_session_payload, run_loop_for
 
 SECTION_NAME = "script_plugin"
 
 
-@pytest.fixture
-def subprocess_run(mocker, monkeypatch):
-    import script
-
-    mock = mocker.Mock(spec=subprocess.run)
-    monkeypatch.setattr(script.subprocess, "run", mock)
-    return mock
-
-
 @pytest.fixture
 def plugin(bus, config, graph):
     graph.providers.clear()
@@ -35,6 +26,17 @@ def plugin(bus, config, graph):
     return instance
 
 
+@pytest.fixture
+def script_exit(bus, mocker):
+    receiver = mocker.Mock()
+    bus.connect(Events.SCRIPT_EXIT, receiver)
+    return receiver
+
+
+def exits(script_exit):
+    return [c.kwargs["payload"] for c in script_exit.call_args_list]
+
+
 @pytest.mark.parametrize(
     "event,option",
     [
@@ -43,13 +45,19 @@ def plugin(bus, config, graph):
         (Events.SESSION_END, "finish_command"),
     ],
 )
-def test_execute_command_when_event_is_trigger(event, option, bus, subprocess_run, config, plugin):
+def test_execute_command_when_event_is_trigger(event, option, bus, config, plugin, script_exit):
     command = config.get(SECTION_NAME, option)
     plugin.activate()
 
-    bus.send(event, create_session_payload())
+    assert bus.send(event, create_session_payload()) == [None]
+    run_loop_for(1)
 
-    subprocess_run.assert_called_once_with(command, shell=True, check=True)
+    [payload] = exits(script_exit)
+    assert payload.command == command
+    assert payload.event == event
+    assert payload.status == 0
+    assert payload.success is True
+    assert payload.stdout == command.split()[-1] + "\n"
 
 
 @pytest.mark.parametrize(
@@ -60,13 +68,17 @@ def test_execute_command_when_event_is_trigger(event, option, bus, subprocess_ru
         (Events.SESSION_END, "finish_command", SessionType.SHORT_BREAK),
     ],
 )
-def test_command_variables(event, section, session_type, bus, subprocess_run, config, plugin):
-    config.set(SECTION_NAME, section, "$event $session")
+def test_command_variables(event, section, session_type, bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, section, "echo $event $session")
     plugin.activate()
 
     bus.send(event, create_session_payload(type=session_type))
+    run_loop_for(1)
 
-    subprocess_run.assert_called_once_with(f"{event.name} {session_type.name}", shell=True, check=True)
+    [payload] = exits(script_exit)
+    assert payload.command == f"echo {event.name} {session_type.name}"
+    assert payload.session == session_type
+    assert payload.stdout == f"{event.name} {session_type.name}\n"
 
 
 @pytest.mark.parametrize(
@@ -77,21 +89,95 @@ def test_command_variables(event, section, session_type, bus, subprocess_run, co
         (Events.SESSION_END, "finish_command"),
     ],
 )
-def test_does_not_execute_commands_when_they_are_not_configured(event, option, bus, subprocess_run, config, plugin):
+def test_does_not_execute_commands_when_they_are_not_configured(event, option, bus, config, plugin, script_exit):
     config.remove(SECTION_NAME, option)
     plugin.activate()
 
-    assert bus.send(event, create_session_payload()) == [False]
+    bus.send(event, create_session_payload())
+    run_loop_for(1)
+
+    script_exit.assert_not_called()
+
+
+def test_execute_command_fail(bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, "start_command", "echo failed >&2; exit 3")
+    plugin.activate()
+
+    bus.send(Events.SESSION_START, create_session_payload())
+    run_loop_for(1)
+
+    [payload] = exits(script_exit)
+    assert payload.status == 3
+    assert payload.success is False
+    assert payload.stderr == "failed\n"
+
+
+def test_does_not_block_the_sender(bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, "start_command", "sleep 1")
+    plugin.activate()
+
+    start = time.monotonic()
+    bus.send(Events.SESSION_START, create_session_payload())
+
+    assert time.monotonic() - start < 0.5
+    script_exit.assert_not_called()
+
+    run_loop_for(2)
+    assert exits(script_exit)[0].status == 0
+
+
+@pytest.mark.parametrize("command", ["sleep 10", "sleep 10; echo done"])
+def test_kills_command_after_timeout(command, bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, "start_command", command)
+    config.set(SECTION_NAME, "timeout", "1")
+    plugin.activate()
+
+    bus.send(Events.SESSION_START, create_session_payload())
+    run_loop_for(2)
+    config.remove(SECTION_NAME, "timeout")
 
-    subprocess_run.assert_not_called()
+    [payload] = exits(script_exit)
+    assert payload.timed_out is True
+    assert payload.status < 0
 
 
-def test_execute_command_fail(bus, config, plugin):
-    config.set(SECTION_NAME, "start_command", "fail")
+def test_runs_commands_in_order_up_to_max_running(bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, "start_command", "sleep 0.5; echo start")
+    config.set(SECTION_NAME, "finish_command", "echo finish")
+    plugin.activate()
+
+    bus.send(Events.SESSION_START, create_session_payload())
+    bus.send(Events.SESSION_END, create_session_payload())
+    assert plugin.running == 1
+    run_loop_for(2)
+
+    assert [payload.stdout for payload in exits(script_exit)] == ["start\n", "finish\n"]
+
+
+def test_spawns_command_in_its_own_process_group(plugin, script_exit):
+    from script import Script
 
+    script = Script("ps -o pgid= -p $$; echo error >&2", Events.SESSION_START, SessionType.POMODORO)
+    plugin.spawn(script)
+    run_loop_for(1)
+
+    [payload] = exits(script_exit)
+    assert payload.success is True
+    assert int(payload.stdout) == script.pid
+    assert payload.stderr == "error\n"
+
+
+def test_finishes_when_the_shell_exits(bus, config, plugin, script_exit):
+    config.set(SECTION_NAME, "start_command", "sleep 3 & echo started")
     plugin.activate()
 
-    assert bus.send(Events.SESSION_START, create_session_payload()) == [False]
+    bus.send(Events.SESSION_START, create_session_payload())
+    run_loop_for(1)
+
+    [payload] = exits(script_exit)
+    assert payload.stdout == "started\n"
+    assert payload.timed_out is False
+    assert plugin.running == 0
 
 
 class TestSettingsWindow:
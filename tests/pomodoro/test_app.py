@@ -4,14 +4,16 @@ from dbus.mainloop.glib import DBusGMainLoop
 from dbusmock import DBusTestCase
 from wiring.scanning import scan_to_graph
 
-from tomate.pomodoro import Application
+from tomate.pomodoro import Application, Events
 from tomate.pomodoro.app import State
 
 DBusGMainLoop(set_as_default=True)
 
 
 @pytest.fixture
-def app(graph, window, plugin_engine, mocker) -> Application:
+def app(graph, bus, config, window, plugin_engine, mocker) -> Application:
+    graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.config", config)
     graph.register_instance("tomate.ui.view", window)
     graph.register_instance("tomate.plugin", plugin_engine)
     graph.register_instance("dbus.session", mocker.Mock())
@@ -32,6 +34,20 @@ def test_collects_plugins_on_start(app, plugin_engine):
     assert plugin_engine.has_plugins() is True
 
 
+def test_watches_plugins_on_start(graph, bus, config, window, plugin_engine, mocker):
+    watch = mocker.spy(plugin_engine, "watch")
+    graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.config", config)
+    graph.register_instance("tomate.ui.view", window)
+    graph.register_instance("tomate.plugin", plugin_engine)
+    graph.register_instance("dbus.session", mocker.Mock())
+    scan_to_graph(["tomate.pomodoro.app"], graph)
+
+    graph.get("tomate.app")
+
+    watch.assert_called_once_with()
+
+
 class TestRun:
     def test_start_window_when_app_is_not_running(self, app, window):
         app.state = State.STOPPED
@@ -47,6 +63,33 @@ class TestRun:
 
         window.show.assert_called_once_with()
 
+    def test_writes_pending_config_changes_when_window_quits(self, app, config, mocker):
+        flush = mocker.spy(config, "flush")
+        app.state = State.STOPPED
+
+        app.Run()
+
+        flush.assert_called_once_with()
+
+
+class TestStats:
+    def test_empty_when_bus_is_not_instrumented(self, app, bus):
+        bus.emit(Events.WINDOW_SHOW)
+
+        assert app.Stats() == []
+
+    def test_receivers_stats(self, app, bus, mocker):
+        bus.instrument()
+        receiver = mocker.Mock()
+        bus.connect(Events.WINDOW_SHOW, receiver)
+
+        bus.emit(Events.WINDOW_SHOW)
+        bus.emit(Events.WINDOW_SHOW)
+
+        ((event, name, calls, total, worst),) = app.Stats()
+        assert (event, name, calls) == ("WINDOW_SHOW", repr(receiver), 2)
+        assert total >= worst > 0
+
 
 class TestFromGraph:
     def setup_method(self):
@@ -55,7 +98,9 @@ class TestFromGraph:
     def teardown_method(self):
         DBusTestCase.tearDownClass()
 
-    def test_create_app_instance_when_it_is_not_registered_in_dbus(self, graph, window, plugin_engine):
+    def test_create_app_instance_when_it_is_not_registered_in_dbus(self, graph, bus, config, window, plugin_engine):
+        graph.register_instance("tomate.bus", bus)
+        graph.register_instance("tomate.config", config)
         graph.register_instance("tomate.ui.view", window)
         graph.register_instance("tomate.plugin", plugin_engine)
         scan_to_graph(["tomate.pomodoro.app"], graph)
@@ -1,6 +1,8 @@
 import os
+import stat
 
 import pytest
+from gi.repository import Gio
 from wiring.scanning import scan_to_graph
 
 from tests.conftest import TEST_DATA_DIR
@@ -21,12 +23,23 @@ def test_module(graph, config):
     assert instance is config
 
 
+def test_instances_do_not_share_parser(bus, config):
+    assert Config(bus).parser is not config.parser
+
+
 def test_get_plugin_paths(config):
     expected = os.path.join(TEST_DATA_DIR, "tomate", "plugins")
 
     assert expected in config.plugin_paths()
 
 
+def test_plugin_paths_keep_xdg_precedence(config, monkeypatch):
+    paths = ["/home/tomate/plugins", "/usr/local/plugins", "/home/tomate/plugins", "/usr/plugins"]
+    monkeypatch.setattr(config, "_load_data_paths", lambda *_: paths)
+
+    assert config.plugin_paths() == ["/home/tomate/plugins", "/usr/local/plugins", "/usr/plugins"]
+
+
 def test_get_config_path(config):
     assert config.config_path() == os.path.join(TEST_DATA_DIR, "tomate", "tomate.conf")
 
@@ -56,6 +69,35 @@ def test_get_icon_path(config):
     assert config.icon_path("tomate", 48, "hicolor") == expected
 
 
+def test_caches_icon_path_until_cache_is_cleared(config, mocker):
+    expected = os.path.join(TEST_DATA_DIR, "icons", "hicolor", "24x24", "apps", "tomate.png")
+    get_icon_path = mocker.patch("tomate.pomodoro.config.IconTheme.getIconPath", return_value=expected)
+
+    assert config.icon_path("tomate", 48, "hicolor") == expected
+    assert config.icon_path("tomate", 48, "hicolor") == expected
+    get_icon_path.assert_called_once()
+
+    config.clear_cache()
+
+    assert config.icon_path("tomate", 48, "hicolor") == expected
+    assert get_icon_path.call_count == 2
+
+
+def test_caches_media_uri(config, mocker):
+    load_data_paths = mocker.spy(config, "_load_data_paths")
+
+    assert config.media_uri("tomate.png") == config.media_uri("tomate.png")
+    load_data_paths.assert_called_once_with("tomate", "media", "tomate.png")
+
+
+def test_creates_config_dir_once(config, mocker):
+    save_config_path = mocker.patch("tomate.pomodoro.config.BaseDirectory.save_config_path")
+    config._config_path = None
+
+    assert config.config_path() == config.config_path()
+    save_config_path.assert_called_once_with("tomate")
+
+
 def test_icon_paths(config):
     assert os.path.join(TEST_DATA_DIR, "icons") in config.icon_paths()
 
@@ -80,6 +122,41 @@ def test_get_defaults_option(config):
     assert config.get("Timer", "shortbreak_duration") == "5"
 
 
+def test_get_option_without_section_from_defaults(config):
+    assert config.get_int("unknown", "long_break_interval") == 4
+    assert config.parser.has_section("unknown") is False
+
+
+def test_get_option_converts_value_once(config, mocker):
+    assert config.get_int("Timer", "pomodoro_duration") == 25
+
+    getint = mocker.spy(config.parser, "getint")
+    has_section = mocker.spy(config.parser, "has_section")
+
+    assert config.get_int("Timer", "pomodoro_duration") == 25
+    assert config.get_int("timer", "pomodoro_duration") == 25
+    getint.assert_not_called()
+    has_section.assert_not_called()
+
+
+def test_get_missing_option_returns_each_caller_fallback(config):
+    assert config.get("section", "missing", fallback="first") == "first"
+    assert config.get("section", "missing", fallback="second") == "second"
+
+
+def test_get_option_after_set_and_remove(config, tmpdir):
+    tmp_path = tmpdir.mkdir("tmp").join("tomate.config")
+    config.config_path = lambda: tmp_path.strpath
+
+    assert config.get_int("Timer", "pomodoro_duration") == 25
+
+    config.set("Timer", "pomodoro_duration", 30)
+    assert config.get_int("Timer", "pomodoro_duration") == 30
+
+    config.remove("Timer", "pomodoro_duration")
+    assert config.get_int("Timer", "pomodoro_duration") == 25
+
+
 def test_set_option(bus, config, mocker, tmpdir):
     config_path = tmpdir.mkdir("tmp").join("tomate.config").strpath
     config.config_path = lambda: config_path
@@ -110,3 +187,241 @@ def test_remove_option(bus, config, mocker, tmpdir):
 
     payload = ConfigPayload("remove", "section", "option", "")
     subscriber.assert_called_once_with(Events.CONFIG_CHANGE, payload=payload)
+
+
+class TestSave:
+    @pytest.fixture
+    def config_path(self, config, tmpdir):
+        path = tmpdir.mkdir("tmp").join("tomate.config")
+        config.config_path = lambda: path.strpath
+        return path
+
+    def test_writes_changes_together_after_delay(self, bus, config, config_path, mocker):
+        timeout_add = mocker.patch("tomate.pomodoro.config.GLib.timeout_add", return_value=1)
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        for value in range(10):
+            config.set("section", "option", value)
+
+        assert config.get_int("section", "option") == 9
+        assert subscriber.call_count == 10
+        assert config_path.exists() is False
+        timeout_add.assert_called_once_with(Config.SAVE_DELAY, config._on_save_timeout)
+
+        config._on_save_timeout()
+
+        assert "option = 9" in config_path.read()
+
+    def test_flush_writes_pending_changes(self, config, config_path):
+        config.set("section", "option", "value")
+
+        config.flush()
+
+        assert "option = value" in config_path.read()
+        assert config_path.dirpath().listdir() == [config_path]
+
+    def test_flush_does_nothing_without_changes(self, config, config_path):
+        config.flush()
+
+        assert config_path.exists() is False
+
+    def test_keeps_symlinked_config_file(self, config, config_path, tmpdir):
+        target = tmpdir.mkdir("dotfiles").join("tomate.conf")
+        target.write("")
+        config_path.mksymlinkto(target)
+
+        config.set("section", "option", "value")
+        config.flush()
+
+        assert config_path.islink() is True
+        assert "option = value" in target.read()
+
+    def test_keeps_config_file_permissions(self, config, config_path):
+        config_path.write("")
+        config_path.chmod(0o640)
+
+        config.set("section", "option", "value")
+        config.flush()
+
+        assert stat.S_IMODE(config_path.stat().mode) == 0o640
+
+    def test_creates_config_file_with_umask_permissions(self, config, config_path):
+        umask = os.umask(0o027)
+        try:
+            config.set("section", "option", "value")
+            config.flush()
+        finally:
+            os.umask(umask)
+
+        assert stat.S_IMODE(config_path.stat().mode) == 0o640
+
+
+class TestTransaction:
+    @pytest.fixture(autouse=True)
+    def config_path(self, config, tmpdir):
+        path = tmpdir.mkdir("tmp").join("tomate.config")
+        config.config_path = lambda: path.strpath
+        return path
+
+    def test_sends_one_change_with_all_the_changes(self, bus, config, mocker):
+        save = mocker.spy(config, "save")
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        with config.transaction():
+            config.set("Section", "first", "value")
+            config.remove("section", "second")
+            config.set("other", "third", "value")
+
+            assert config.get("section", "first") == "value"
+            subscriber.assert_not_called()
+
+        changes = (
+            ConfigPayload("set", "section", "first", "value"),
+            ConfigPayload("remove", "section", "second", ""),
+            ConfigPayload("set", "other", "third", "value"),
+        )
+        subscriber.assert_called_once_with(Events.CONFIG_CHANGE, payload=ConfigPayload("batch", "", "", "", changes))
+        save.assert_called_once_with()
+
+        payload = subscriber.call_args.kwargs["payload"]
+        assert payload.keys == (("section", "first"), ("section", "second"), ("other", "third"))
+        assert payload.touches("other") is True
+        assert payload.touches("timer") is False
+
+    def test_sets_section_when_all_changes_are_in_it(self, bus, config, mocker):
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        with config.transaction():
+            config.set("section", "first", "value")
+            config.set("section", "second", "value")
+
+        assert subscriber.call_args.kwargs["payload"].section == "section"
+
+    def test_nested_transactions_join_the_outer_one(self, bus, config, mocker):
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        with config.transaction():
+            with config.transaction():
+                config.set("section", "first", "value")
+            config.set("section", "second", "value")
+
+        subscriber.assert_called_once()
+        assert len(subscriber.call_args.kwargs["payload"].changes) == 2
+
+    def test_sends_changes_made_before_an_error(self, bus, config, mocker):
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        with pytest.raises(ValueError):
+            with config.transaction():
+                config.set("section", "option", "value")
+                raise ValueError()
+
+        assert subscriber.call_args.kwargs["payload"].keys == (("section", "option"),)
+
+    def test_does_not_send_empty_transactions(self, bus, config, mocker):
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+
+        with config.transaction():
+            pass
+
+        subscriber.assert_not_called()
+
+    def test_single_change_payload(self):
+        payload = ConfigPayload("set", "section", "option", "value")
+
+        assert payload.changes == (payload,)
+        assert payload.keys == (("section", "option"),)
+
+
+class TestReload:
+    @pytest.fixture
+    def config_path(self, config, tmpdir):
+        path = tmpdir.mkdir("tmp").join("tomate.config")
+        config.config_path = lambda: path.strpath
+        config.set("section", "option", "value")
+        config.flush()
+        return path
+
+    @pytest.fixture
+    def subscriber(self, bus, config_path, mocker):
+        subscriber = mocker.Mock()
+        bus.connect(Events.CONFIG_CHANGE, subscriber, weak=False)
+        return subscriber
+
+    @staticmethod
+    def write(path, text: str, old: str = "option = value") -> None:
+        content = path.read().replace(old, text)
+        path.write(content)
+        # the file system time resolution can hide a fast second write
+        mtime = os.stat(path.strpath).st_mtime_ns
+        os.utime(path.strpath, ns=(mtime + 1, mtime + 1))
+
+    def test_ignores_own_writes(self, config, subscriber):
+        config.set("section", "other", "value")
+        config.flush()
+        subscriber.reset_mock()
+
+        config.reload()
+
+        subscriber.assert_not_called()
+
+    def test_ignores_writes_without_changes(self, config, config_path, subscriber):
+        self.write(config_path, "option = value")
+
+        config.reload()
+
+        subscriber.assert_not_called()
+
+    def test_sends_changed_option(self, config, config_path, subscriber):
+        self.write(config_path, "option = changed")
+
+        config.reload()
+
+        assert config.get("section", "option") == "changed"
+        payload = ConfigPayload("set", "section", "option", "changed")
+        subscriber.assert_called_once_with(Events.CONFIG_CHANGE, payload=payload)
+
+    def test_sends_all_changed_options_together(self, config, config_path, subscriber):
+        self.write(config_path, "added = value\n\n[reloaded]\nnew = value")
+
+        config.reload()
+
+        assert config.get("section", "option") is None
+        assert config.get("reloaded", "new") == "value"
+        payload = subscriber.call_args.kwargs["payload"]
+        assert set(payload.changes) == {
+            ConfigPayload("set", "section", "added", "value"),
+            ConfigPayload("set", "reloaded", "new", "value"),
+            ConfigPayload("remove", "section", "option", ""),
+        }
+        subscriber.assert_called_once()
+
+    def test_ignores_invalid_file(self, config, config_path, subscriber):
+        self.write(config_path, "option")
+
+        config.reload()
+
+        assert config.get("section", "option") == "value"
+        subscriber.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "event, reloaded",
+        [
+            (Gio.FileMonitorEvent.CHANGES_DONE_HINT, True),
+            (Gio.FileMonitorEvent.CREATED, True),
+            (Gio.FileMonitorEvent.CHANGED, False),
+            (Gio.FileMonitorEvent.DELETED, False),
+        ],
+    )
+    def test_reloads_when_file_monitor_says_changes_are_done(self, event, reloaded, config, mocker):
+        reload = mocker.patch.object(config, "reload")
+
+        config._on_file_changed(None, None, None, event)
+
+        assert reload.called is reloaded
@@ -1,6 +1,7 @@
 from wiring.scanning import scan_to_graph
 
-from tomate.pomodoro import Bus, Events, Subscriber, on
+from tomate.pomodoro import Bus, Events, Priority, Subscriber, on
+from tomate.ui.testing import refresh_gui
 
 
 class TestBus:
@@ -20,6 +21,124 @@ class TestBus:
 
         assert bus.send(Events.SESSION_START, payload="payload") == []
 
+    def test_emit_event_without_results(self, bus, mocker):
+        receiver = mocker.Mock(return_value="result")
+        bus.connect(Events.SESSION_START, receiver)
+
+        assert bus.emit(Events.SESSION_START, payload="payload") is None
+        receiver.assert_called_once_with(Events.SESSION_START, payload="payload")
+
+    def test_connect_receiver_once(self, bus, mocker):
+        receiver = mocker.Mock(return_value="result")
+        bus.connect(Events.SESSION_START, receiver)
+        bus.connect(Events.SESSION_START, receiver)
+
+        assert bus.send(Events.SESSION_START) == ["result"]
+
+    def test_calls_receivers_in_connection_order(self, bus, mocker):
+        first = mocker.Mock(return_value="first")
+        second = mocker.Mock(return_value="second")
+        bus.connect(Events.SESSION_START, first)
+        bus.connect(Events.SESSION_START, second)
+
+        assert bus.send(Events.SESSION_START) == ["first", "second"]
+
+    def test_calls_receivers_by_priority(self, bus, mocker):
+        low = mocker.Mock(return_value="low")
+        default = mocker.Mock(return_value="default")
+        high = mocker.Mock(return_value="high")
+        bus.connect(Events.SESSION_START, low, priority=Priority.LOW)
+        bus.connect(Events.SESSION_START, default)
+        bus.connect(Events.SESSION_START, high, priority=Priority.HIGH)
+
+        assert bus.send(Events.SESSION_START) == ["high", "default", "low"]
+
+    def test_defers_receiver_to_idle_queue(self, bus, mocker):
+        receiver = mocker.Mock(return_value="result")
+        bus.connect(Events.SESSION_START, receiver, deferred=True)
+
+        assert bus.send(Events.SESSION_START, payload="first") == [None]
+        bus.emit(Events.SESSION_START, payload="second")
+        receiver.assert_not_called()
+
+        refresh_gui()
+
+        assert receiver.call_args_list == [
+            mocker.call(Events.SESSION_START, payload="first"),
+            mocker.call(Events.SESSION_START, payload="second"),
+        ]
+
+    def test_coalesces_deferred_timer_updates(self, bus, mocker):
+        receiver = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, receiver, deferred=True)
+
+        for time_left in range(3):
+            bus.emit(Events.TIMER_UPDATE, payload=time_left)
+
+        refresh_gui()
+
+        receiver.assert_called_once_with(Events.TIMER_UPDATE, payload=2)
+
+    def test_disconnect_cancels_deferred_receiver(self, bus, mocker):
+        receiver = mocker.Mock()
+        bus.connect(Events.SESSION_START, receiver, deferred=True)
+
+        bus.emit(Events.SESSION_START)
+        bus.disconnect(Events.SESSION_START, receiver)
+        refresh_gui()
+
+        receiver.assert_not_called()
+
+    def test_instrument_receivers(self, bus, mocker):
+        receiver = mocker.Mock()
+        bus.connect(Events.SESSION_START, receiver)
+
+        assert bus.stats() == []
+
+        bus.instrument()
+        bus.emit(Events.SESSION_START)
+
+        assert [row[:3] for row in bus.stats()] == [("SESSION_START", repr(receiver), 1)]
+
+    def test_instrument_receivers_of_each_instance(self, bus):
+        class Subject(Subscriber):
+            @on(Events.SESSION_START)
+            def bar(self, **__):
+                pass
+
+        first, second = Subject(), Subject()
+        first.connect(bus)
+        second.connect(bus)
+        bus.instrument()
+        bus.emit(Events.SESSION_START)
+
+        assert sorted(row[1] for row in bus.stats()) == sorted(
+            "%s.%s at 0x%x" % (__name__, Subject.bar.__qualname__, id(subject)) for subject in (first, second)
+        )
+
+    def test_disconnect_receiver_while_sending(self, bus, mocker):
+        second = mocker.Mock(return_value="second")
+        first = mocker.Mock(side_effect=lambda *_, **__: bus.disconnect(Events.SESSION_START, second))
+        bus.connect(Events.SESSION_START, first)
+        bus.connect(Events.SESSION_START, second)
+
+        assert bus.send(Events.SESSION_START) == [None, "second"]
+        assert bus.send(Events.SESSION_START) == [None]
+
+    def test_disconnect_receivers_of_module(self, bus, mocker):
+        class Subject(Subscriber):
+            @on(Events.SESSION_START, Events.WINDOW_SHOW)
+            def bar(self, **__):
+                return "subject"
+
+        Subject().connect(bus)
+        other = mocker.Mock(return_value="other")
+        bus.connect(Events.SESSION_START, other)
+
+        assert bus.disconnect_module(__name__) == 2
+        assert bus.send(Events.SESSION_START) == ["other"]
+        assert bus.send(Events.WINDOW_SHOW) == []
+
 
 def test_subscriber(bus):
     class Subject(Subscriber):
@@ -44,6 +163,79 @@ def test_subscriber(bus):
     assert bus.send(Events.SESSION_START) == []
 
 
+def test_subscriber_receives_only_the_payload(bus):
+    class Subject(Subscriber):
+        @on(Events.TIMER_UPDATE)
+        def foo(self, *args, **kwargs):
+            return args, kwargs
+
+    Subject().connect(bus)
+
+    assert bus.send(Events.TIMER_UPDATE, "payload") == [((), {"payload": "payload"})]
+
+
+def test_subscriber_handlers_priority(bus):
+    class Plugin(Subscriber):
+        @on(Events.TIMER_UPDATE)
+        def foo(self, **__):
+            return "plugin"
+
+    class Widget(Subscriber):
+        @on(Events.TIMER_UPDATE, priority=Priority.HIGH)
+        def foo(self, **__):
+            return "widget"
+
+    Plugin().connect(bus)
+    Widget().connect(bus)
+
+    assert bus.send(Events.TIMER_UPDATE) == ["widget", "plugin"]
+
+
+def test_deferred_subscriber(bus):
+    class Subject(Subscriber):
+        deferred = True
+
+        def __init__(self):
+            self.payloads = []
+
+        @on(Events.TIMER_UPDATE)
+        def foo(self, payload):
+            self.payloads.append(payload)
+
+    subject = Subject()
+    subject.connect(bus)
+
+    bus.emit(Events.TIMER_UPDATE, payload=1)
+    bus.emit(Events.TIMER_UPDATE, payload=2)
+    assert subject.payloads == []
+
+    refresh_gui()
+    assert subject.payloads == [2]
+
+
+def test_subscriber_inherits_handlers(bus):
+    class Parent(Subscriber):
+        @on(Events.TIMER_START)
+        def foo(self, **__) -> str:
+            return "parent.foo"
+
+        @on(Events.TIMER_START)
+        def bar(self, **__) -> str:
+            return "parent.bar"
+
+    class Child(Parent):
+        @on(Events.TIMER_START)
+        def foo(self, **__) -> str:
+            return "child.foo"
+
+        def bar(self, **__) -> str:
+            return "child.bar"
+
+    Child().connect(bus)
+
+    assert bus.send(Events.TIMER_START) == ["child.foo"]
+
+
 def test_module(graph):
     scan_to_graph(["tomate.pomodoro.event"], graph)
     instance = graph.get("tomate.bus")
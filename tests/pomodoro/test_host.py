@@ -0,0 +1,151 @@
+import os
+import time
+
+import pytest
+
+from tomate.pomodoro import Events, PluginEngine
+from tomate.pomodoro.host import IsolatedPlugin, handle
+from tomate.pomodoro.plugin import LazyPlugin
+from tomate.ui.testing import run_loop_for
+
+SOURCE = """import os
+import time
+
+import tomate.pomodoro.plugin as plugin
+from tomate.pomodoro import Events, on
+
+
+class Isolated(plugin.Plugin):
+    @on(Events.SESSION_START)
+    def on_session_start(self, payload):
+        if payload == "crash":
+            os._exit(1)
+        if payload == "block":
+            time.sleep(10)
+        if payload == "raise":
+            raise ValueError("broken payload")
+
+        with open({output!r}, "a") as output:
+            output.write("%d %s\\n" % (os.getpid(), payload))
+"""
+
+
+@pytest.fixture
+def output(tmpdir):
+    return tmpdir.join("output")
+
+
+@pytest.fixture
+def plugin_dir(config, tmpdir, output):
+    plugin_dir = tmpdir.mkdir("plugins")
+    plugin_dir.join("isolated.plugin").write(
+        "[Core]\nName = Isolated\nModule = isolated\n\n[Documentation]\nVersion = 1.0\n\n"
+        "[Host]\nIsolated = True\nTimeout = 500\n"
+    )
+    plugin_dir.join("isolated.py").write(SOURCE.format(output=output.strpath))
+    config.plugin_paths = lambda: [plugin_dir.strpath]
+    config.parser.set("Plugin Management", "default_plugins_to_load", "Isolated")
+    return plugin_dir
+
+
+@pytest.fixture
+def host_enabled(config):
+    config.set(PluginEngine.HOST_SECTION, "enabled", "true")
+    yield
+    config.remove(PluginEngine.HOST_SECTION, "enabled")
+
+
+@pytest.fixture
+def plugin_engine(bus, config, graph, plugin_dir, host_enabled) -> PluginEngine:
+    plugin_engine = PluginEngine(bus, config, graph)
+    plugin_engine.collect()
+    run_loop_for(2)
+    yield plugin_engine
+    plugin_engine.deactivate("Isolated")
+
+
+def lines(output):
+    return [line.split(" ", 1) for line in output.read().splitlines()] if output.exists() else []
+
+
+def test_runs_plugin_in_child_process(bus, plugin_engine, output):
+    plugin = plugin_engine.lookup("Isolated")
+    assert isinstance(plugin.plugin_object, IsolatedPlugin)
+    assert plugin.is_activated is True
+
+    bus.send(Events.SESSION_START, "started")
+    run_loop_for(1)
+
+    [(pid, payload)] = lines(output)
+    assert payload == "started"
+    assert int(pid) != os.getpid()
+
+
+@pytest.mark.parametrize("payload", ["block", "crash"])
+def test_restarts_plugin_that_blocks_or_crashes(bus, plugin_engine, output, payload):
+    bus.send(Events.SESSION_START, payload)
+    run_loop_for(3)
+
+    bus.send(Events.SESSION_START, "again")
+    run_loop_for(1)
+
+    assert [payload for _, payload in lines(output)] == ["again"]
+    assert plugin_engine.lookup("Isolated").is_activated is True
+
+
+def test_logs_traceback_of_plugin_error(bus, plugin_engine, caplog):
+    bus.send(Events.SESSION_START, "raise")
+    run_loop_for(1)
+
+    assert "in on_session_start" in caplog.text
+    assert "ValueError: broken payload" in caplog.text
+    assert plugin_engine.lookup("Isolated").is_activated is True
+
+
+def test_sends_repr_of_results_that_cannot_be_pickled(bus):
+    def result():
+        pass
+
+    bus.connect(Events.SESSION_START, lambda *_, **__: result)
+
+    assert handle(bus, 1, Events.SESSION_START, None) == ("result", 1, [repr(result)])
+
+
+def test_gives_up_after_max_restarts(bus, plugin_engine, output):
+    for _ in range(IsolatedPlugin.MAX_RESTARTS + 1):
+        bus.send(Events.SESSION_START, "crash")
+        run_loop_for(2)
+
+    assert plugin_engine.lookup("Isolated").is_activated is False
+    assert bus.has_receivers(Events.SESSION_START) is False
+
+
+def test_stops_plugin_without_blocking(bus, plugin_engine):
+    process = plugin_engine.lookup("Isolated").plugin_object._process
+    bus.send(Events.SESSION_START, "block")
+    run_loop_for(0.1)
+
+    start = time.monotonic()
+    plugin_engine.deactivate("Isolated")
+
+    assert time.monotonic() - start < 0.1
+    run_loop_for(1)
+    assert process.is_alive() is False
+
+
+def test_runs_plugins_in_process_by_default(bus, config, graph, plugin_dir):
+    plugin_engine = PluginEngine(bus, config, graph)
+    plugin_engine.collect()
+
+    assert isinstance(plugin_engine.lookup("Isolated").plugin_object, LazyPlugin)
+
+
+def test_runs_plugins_with_settings_in_process(bus, config, graph, plugin_dir, host_enabled):
+    plugin_dir.join("isolated.plugin").write(
+        "[Core]\nName = Isolated\nModule = isolated\n\n[Documentation]\nVersion = 1.0\nHasSettings = True\n\n"
+        "[Host]\nIsolated = True\n"
+    )
+    plugin_engine = PluginEngine(bus, config, graph)
+    plugin_engine.collect()
+
+    assert isinstance(plugin_engine.lookup("Isolated").plugin_object, LazyPlugin)
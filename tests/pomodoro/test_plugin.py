@@ -2,9 +2,12 @@ import os
 from distutils.version import StrictVersion
 
 import pytest
+from gi.repository import Gio
 from wiring.scanning import scan_to_graph
+from yapsy.PluginFileLocator import PluginFileLocator
 
 from tomate.pomodoro import Events, PluginEngine, suppress_errors
+from tomate.ui.testing import run_loop_for
 
 
 @pytest.fixture
@@ -67,6 +70,54 @@ class TestPluginEngine:
             ("PluginB", StrictVersion("2.0.0"), True, False),
         ]
 
+    def test_imports_only_activated_plugins(self, plugin_engine):
+        plugin_engine.collect()
+
+        plugin_a = plugin_engine.lookup("PluginA")
+        assert plugin_a.plugin_object.has_settings is True
+        assert plugin_a.plugin_object.is_loaded is False
+        assert plugin_engine.lookup("PluginB").plugin_object.is_loaded is True
+
+        plugin_engine.activate("PluginA")
+
+        assert plugin_a.plugin_object.is_loaded is True
+        assert plugin_a.plugin_object.parent is None
+
+    def test_does_not_activate_plugin_that_fails_to_import(self, bus, graph, config, tmpdir):
+        tmpdir.join("broken.plugin").write("[Core]\nName = Broken\nModule = broken\n\n[Documentation]\nVersion = 1.0\n")
+        tmpdir.join("broken.py").write("raise ImportError('missing dependency')\n")
+        config.plugin_paths = lambda: [tmpdir.strpath]
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        plugin_engine.activate("Broken")
+
+        broken = plugin_engine.lookup("Broken")
+        assert broken.is_activated is False
+        assert broken.error is not None
+
+    def test_activates_plugin_class_imported_from_another_module(self, bus, graph, config, monkeypatch, tmpdir):
+        library = tmpdir.mkdir("library")
+        library.join("reexported_impl.py").write(
+            "import tomate.pomodoro.plugin as plugin\n\n\n"
+            "class Base(plugin.Plugin):\n    pass\n\n\n"
+            "class Reexported(Base):\n    pass\n"
+        )
+        monkeypatch.syspath_prepend(library.strpath)
+        tmpdir.join("reexported.plugin").write(
+            "[Core]\nName = Reexported\nModule = reexported\n\n[Documentation]\nVersion = 1.0\n"
+        )
+        tmpdir.join("reexported.py").write("from reexported_impl import Base, Reexported\n")
+        config.plugin_paths = lambda: [tmpdir.strpath]
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        plugin_engine.activate("Reexported")
+
+        reexported = plugin_engine.lookup("Reexported")
+        assert reexported.is_activated is True
+        assert type(reexported.plugin_object.load()).__name__ == "Reexported"
+
     def test_lookup(self, plugin_engine):
         plugin_engine.collect()
 
@@ -77,6 +128,247 @@ class TestPluginEngine:
         assert plugin is not None
 
 
+class TestStartup:
+    @pytest.fixture
+    def plugin_engine(self, bus, graph, config, tmpdir) -> PluginEngine:
+        for name, delay in (("Slow", 0.5), ("Fast", 0)):
+            tmpdir.join(name.lower() + ".plugin").write(
+                "[Core]\nName = {}\nModule = {}\n\n[Documentation]\nVersion = 1.0\n".format(name, name.lower())
+            )
+            tmpdir.join(name.lower() + ".py").write(
+                "import time\n\nimport tomate.pomodoro.plugin as plugin\n\ntime.sleep({})\n\n\n"
+                "class {}(plugin.Plugin):\n    pass\n".format(delay, name)
+            )
+
+        config.plugin_paths = lambda: [tmpdir.strpath]
+        config.parser.set("Plugin Management", "default_plugins_to_load", "Slow;;Fast")
+        return PluginEngine(bus, config, graph)
+
+    def test_activates_enabled_plugins_within_budget(self, plugin_engine):
+        plugin_engine.collect(budget=5000)
+
+        assert plugin_engine.lookup("Slow").is_activated is True
+        assert plugin_engine.lookup("Fast").is_activated is True
+
+    def test_defers_plugins_that_miss_the_budget_in_order(self, plugin_engine, mocker):
+        activate = mocker.spy(plugin_engine, "activate")
+
+        plugin_engine.collect(budget=0)
+
+        assert plugin_engine.lookup("Slow").is_activated is False
+        assert plugin_engine.lookup("Fast").is_activated is False
+
+        run_loop_for(1)
+
+        assert plugin_engine.lookup("Slow").is_activated is True
+        assert plugin_engine.lookup("Fast").is_activated is True
+        assert [c.args for c in activate.call_args_list] == [("Slow",), ("Fast",)]
+
+    def test_prefetch_does_not_activate_plugins(self, plugin_engine):
+        plugin_engine.prefetch()
+
+        assert plugin_engine.has_plugins() is True
+        assert plugin_engine.lookup("Fast").is_activated is False
+
+
+class TestPluginIndex:
+    PACKAGE = (
+        "import tomate.pomodoro.plugin as plugin\n"
+        "from tomate.pomodoro import Events, on\n\n\n"
+        "class Pack(plugin.Plugin):\n"
+        "    @on(Events.WINDOW_HIDE)\n"
+        "    def hidden(self, **_):\n"
+        "        return 'pack', {}\n"
+    )
+
+    @pytest.fixture
+    def plugin_dir(self, config, tmpdir):
+        plugin_dir = tmpdir.mkdir("plugins")
+        plugin_dir.join("indexed.plugin").write(
+            "[Core]\nName = Indexed\nModule = indexed\n\n[Documentation]\nVersion = 1.0\nHasSettings = True\n"
+        )
+        plugin_dir.join("indexed.py").write(
+            "import tomate.pomodoro.plugin as plugin\n\n\nclass Indexed(plugin.Plugin):\n    pass\n"
+        )
+        config.plugin_paths = lambda: [plugin_dir.strpath]
+        return plugin_dir
+
+    @pytest.fixture
+    def parse(self, mocker):
+        return mocker.spy(PluginFileLocator, "_getInfoForPluginFromAnalyzer")
+
+    def test_reuses_index_when_nothing_changed(self, bus, config, graph, plugin_dir, parse):
+        PluginEngine(bus, config, graph).collect()
+        assert parse.call_count == 1
+        assert os.path.exists(config.cache_path("plugins.json"))
+
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        assert parse.call_count == 1
+        indexed = plugin_engine.lookup("Indexed")
+        assert indexed.version == StrictVersion("1.0")
+        assert indexed.plugin_object.has_settings is True
+        assert indexed.path == os.path.join(plugin_dir.strpath, "indexed")
+
+    def test_parses_changed_plugin_file(self, bus, config, graph, plugin_dir, parse):
+        PluginEngine(bus, config, graph).collect()
+
+        plugin_dir.join("indexed.plugin").write(
+            "[Core]\nName = Indexed\nModule = indexed\n\n[Documentation]\nVersion = 2.0.0\n"
+        )
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        assert parse.call_count == 2
+        assert plugin_engine.lookup("Indexed").version == StrictVersion("2.0.0")
+
+    def test_does_not_walk_unchanged_directories(self, bus, config, graph, plugin_dir, mocker):
+        PluginEngine(bus, config, graph).collect()
+        walk = mocker.spy(PluginFileLocator, "locatePlugins")
+
+        PluginEngine(bus, config, graph).collect()
+
+        walk.assert_not_called()
+
+    def test_finds_plugin_added_to_the_directory(self, bus, config, graph, plugin_dir):
+        PluginEngine(bus, config, graph).collect()
+
+        plugin_dir.join("added.plugin").write(
+            "[Core]\nName = Added\nModule = added\n\n[Documentation]\nVersion = 1.0\n"
+        )
+        plugin_dir.join("added.py").write("")
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        assert plugin_engine.lookup("Added") is not None
+
+    def test_ignores_broken_index(self, bus, config, graph, plugin_dir, parse):
+        with open(config.cache_path("plugins.json"), "w") as f:
+            f.write("{broken")
+
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect()
+
+        assert parse.call_count == 1
+        assert plugin_engine.lookup("Indexed") is not None
+
+
+class TestReload:
+    SOURCE = (
+        "import tomate.pomodoro.plugin as plugin\n"
+        "from tomate.pomodoro import Events, Subscriber, on\n\n"
+        "VERSION = {}\n\n\n"
+        "class Helper(Subscriber):\n"
+        "    @on(Events.SESSION_START)\n"
+        "    def started(self, **_):\n"
+        "        return 'helper', VERSION\n\n\n"
+        "class Hot(plugin.Plugin):\n"
+        "    def activate(self):\n"
+        "        super().activate()\n"
+        "        # never disconnected by the plugin\n"
+        "        Helper().connect(self.bus)\n\n"
+        "    @on(Events.WINDOW_SHOW)\n"
+        "    def shown(self, **_):\n"
+        "        return 'hot', VERSION\n"
+    )
+
+    @pytest.fixture
+    def plugin_dir(self, config, tmpdir):
+        plugin_dir = tmpdir.mkdir("plugins")
+        plugin_dir.join("hot.plugin").write("[Core]\nName = Hot\nModule = hot\n\n[Documentation]\nVersion = 1.0\n")
+        plugin_dir.join("hot.py").write(self.SOURCE.format(1))
+        config.plugin_paths = lambda: [plugin_dir.strpath]
+        config.parser.set("Plugin Management", "default_plugins_to_load", "Hot")
+        return plugin_dir
+
+    @pytest.fixture
+    def plugin_engine(self, bus, config, graph, plugin_dir) -> PluginEngine:
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect(budget=5000)
+        return plugin_engine
+
+    def test_reloads_activated_plugin_without_leftover_receivers(self, bus, config, plugin_dir, plugin_engine):
+        assert bus.send(Events.WINDOW_SHOW) == [("hot", 1)]
+        assert bus.send(Events.SESSION_START) == [("helper", 1)]
+
+        plugin_dir.join("hot.py").write(self.SOURCE.format(2))
+
+        assert plugin_engine.reload("Hot") is True
+        assert plugin_engine.lookup("Hot").is_activated is True
+        assert bus.send(Events.WINDOW_SHOW) == [("hot", 2)]
+        assert bus.send(Events.SESSION_START) == [("helper", 2)]
+        assert config.parser.get("Plugin Management", "default_plugins_to_load") == "Hot"
+
+    def test_keeps_deactivated_plugin_deactivated(self, bus, plugin_dir, plugin_engine):
+        plugin_engine.deactivate("Hot")
+        plugin_dir.join("hot.py").write(self.SOURCE.format(2))
+
+        plugin_engine.reload("Hot")
+
+        assert plugin_engine.lookup("Hot").is_activated is False
+        assert bus.send(Events.WINDOW_SHOW) == []
+        assert bus.send(Events.SESSION_START) == []
+
+    def test_activates_fixed_plugin_after_import_error(self, bus, plugin_dir, plugin_engine):
+        plugin_dir.join("hot.py").write("raise ImportError('missing dependency')\n")
+
+        assert plugin_engine.reload("Hot") is False
+        assert bus.send(Events.WINDOW_SHOW) == []
+        assert bus.send(Events.SESSION_START) == []
+
+        plugin_dir.join("hot.py").write(self.SOURCE.format(3))
+
+        assert plugin_engine.reload("Hot") is True
+        assert bus.send(Events.WINDOW_SHOW) == [("hot", 3)]
+
+    def test_reloads_plugin_when_its_module_changes(self, bus, plugin_dir, plugin_engine):
+        plugin_engine.watch()
+
+        plugin_dir.join("hot.py").write(self.SOURCE.format(2))
+        run_loop_for(1)
+
+        assert bus.send(Events.WINDOW_SHOW) == [("hot", 2)]
+        assert bus.send(Events.SESSION_START) == [("helper", 2)]
+
+    @pytest.mark.parametrize(
+        "event, name, reloaded",
+        [
+            ("CHANGES_DONE_HINT", "hot.py", True),
+            ("MOVED_IN", "hot.py", True),
+            ("RENAMED", "hot.py~", True),
+            ("CREATED", "hot.py", False),
+            ("CHANGED", "hot.py", False),
+        ],
+    )
+    def test_reloads_plugin_once_the_module_is_written(self, event, name, reloaded, plugin_dir, plugin_engine, mocker):
+        reload = mocker.patch.object(plugin_engine, "reload")
+        file = Gio.File.new_for_path(plugin_dir.join(name).strpath)
+        # a rename reports the temporary file and then the file it replaced
+        other_file = Gio.File.new_for_path(plugin_dir.join("hot.py").strpath)
+
+        plugin_engine._on_plugin_file_changed(None, file, other_file, getattr(Gio.FileMonitorEvent, event))
+
+        assert reload.called is reloaded
+
+    def test_reloads_plugin_when_a_module_of_its_package_changes(self, bus, config, graph, plugin_dir):
+        package_dir = plugin_dir.mkdir("pack")
+        plugin_dir.join("pack.plugin").write("[Core]\nName = Pack\nModule = pack\n\n[Documentation]\nVersion = 1.0\n")
+        package_dir.join("__init__.py").write(self.PACKAGE.format(1))
+        config.parser.set("Plugin Management", "default_plugins_to_load", "Pack")
+        plugin_engine = PluginEngine(bus, config, graph)
+        plugin_engine.collect(budget=5000)
+        plugin_engine.watch()
+
+        package_dir.join("__init__.py").write(self.PACKAGE.format(2))
+        run_loop_for(1)
+
+        assert bus.send(Events.WINDOW_HIDE) == [("pack", 2)]
+
+    def test_does_not_reload_unknown_plugin(self, plugin_engine):
+        assert plugin_engine.reload("Not Exist") is False
+
+
 class TestRaiseException:
     def test_does_not_raise_exception_when_debug_is_disabled(self):
         os.unsetenv("TOMATE_DEBUG")
@@ -226,6 +226,18 @@ class TestSessionChange:
         payload = create_session_payload(duration=20 * 60)
         subscriber.assert_called_once_with(Events.SESSION_CHANGE, payload=payload)
 
+    def test_changes_once_when_config_transaction_changes_timer(self, bus, config, mocker, session):
+        session.state = State.STOPPED
+        subscriber = mocker.Mock()
+        bus.connect(Events.SESSION_CHANGE, subscriber, False)
+
+        with config.transaction():
+            config.set("section", "option", "value")
+            for session_type in SessionType:
+                config.set(config.DURATION_SECTION, session_type.option, 10)
+
+        subscriber.assert_called_once_with(Events.SESSION_CHANGE, payload=create_session_payload(duration=10 * 60))
+
     def test_not_change_when_config_section_is_not_timer(self, bus, config, mocker, session):
         subscriber = mocker.Mock()
         bus.connect(Events.SESSION_CHANGE, subscriber, False)
@@ -244,6 +256,36 @@ class TestSessionChange:
         subscriber.assert_not_called()
 
 
+class TestSessionDuration:
+    def test_reads_config_only_after_timer_section_changes(self, config, mocker, session):
+        assert session.duration == 25 * 60
+
+        get_int = mocker.spy(config, "get_int")
+        getint = mocker.spy(config.parser, "getint")
+        for _ in range(3):
+            assert session.duration == 25 * 60
+
+        config.set("section", "option", "value")
+        assert session.duration == 25 * 60
+        get_int.assert_not_called()
+        getint.assert_not_called()
+
+        config.set(config.DURATION_SECTION, SessionType.POMODORO.option, 20)
+        assert session.duration == 20 * 60
+        assert session.duration == 20 * 60
+        assert get_int.call_count == 1
+        assert getint.call_count == 1
+
+    def test_caches_duration_by_session_type(self, config, session):
+        config.set(config.DURATION_SECTION, SessionType.SHORT_BREAK.option, 3)
+
+        session.current = SessionType.SHORT_BREAK
+        assert session.duration == 3 * 60
+
+        session.current = SessionType.POMODORO
+        assert session.duration == 25 * 60
+
+
 @pytest.mark.parametrize(
     "number,session_type",
     [
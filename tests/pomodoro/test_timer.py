@@ -1,13 +1,15 @@
 import pytest
+from gi.repository import GLib
 from wiring.scanning import scan_to_graph
 
 from tomate.pomodoro import Events, Timer, TimerPayload
-from tomate.pomodoro.timer import State
+from tomate.pomodoro.timer import _COUNTDOWN, _COUNTDOWN_LIMIT, State, format_seconds
 from tomate.ui.testing import run_loop_for
 
 
-def test_module(bus, graph):
+def test_module(bus, config, graph):
     graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.config", config)
     scan_to_graph(["tomate.pomodoro.timer"], graph)
 
     instance = graph.get("tomate.timer")
@@ -16,15 +18,15 @@ def test_module(bus, graph):
 
 
 class TestTimerStart:
-    def test_not_start_when_timer_is_already_running(self, bus):
-        timer = Timer(bus)
+    def test_not_start_when_timer_is_already_running(self, bus, config):
+        timer = Timer(bus, config)
         timer.state = State.STARTED
 
         assert not timer.start(60)
 
     @pytest.mark.parametrize("state", [State.ENDED, State.STOPPED])
-    def test_starts_when_timer_not_started_yet(self, bus, mocker, state):
-        timer = Timer(bus)
+    def test_starts_when_timer_not_started_yet(self, bus, config, mocker, state):
+        timer = Timer(bus, config)
         timer.state = state
 
         subscriber = mocker.Mock()
@@ -38,14 +40,14 @@ class TestTimerStart:
 
 class TestTimerStop:
     @pytest.mark.parametrize("state", [State.ENDED, State.STOPPED])
-    def test_not_stop_when_timer_is_not_running(self, bus, state):
-        timer = Timer(bus)
+    def test_not_stop_when_timer_is_not_running(self, bus, config, state):
+        timer = Timer(bus, config)
         timer.state = state
 
         assert not timer.stop()
 
-    def test_stops_when_timer_is_running(self, bus, mocker):
-        timer = Timer(bus)
+    def test_stops_when_timer_is_running(self, bus, config, mocker):
+        timer = Timer(bus, config)
         subscriber = mocker.Mock()
         bus.connect(Events.TIMER_STOP, subscriber, weak=False)
 
@@ -59,14 +61,14 @@ class TestTimerStop:
 
 class TestTimerEnd:
     @pytest.mark.parametrize("state", [State.ENDED, State.STOPPED])
-    def test_not_end_when_timer_is_not_running(self, bus, state):
-        timer = Timer(bus)
+    def test_not_end_when_timer_is_not_running(self, bus, config, state):
+        timer = Timer(bus, config)
         timer.state = state
 
         assert not timer.end()
 
-    def test_ends_when_time_is_up(self, bus, mocker):
-        timer = Timer(bus)
+    def test_ends_when_time_is_up(self, bus, config, mocker):
+        timer = Timer(bus, config)
         changed = mocker.Mock()
         timer._bus.connect(Events.TIMER_UPDATE, changed, weak=False)
 
@@ -77,8 +79,238 @@ class TestTimerEnd:
         run_loop_for(2)
 
         assert timer.is_running() is False
-        changed.assert_called_once_with(Events.TIMER_UPDATE, payload=TimerPayload(time_left=0, duration=1))
-        finished.assert_called_once_with(Events.TIMER_END, payload=TimerPayload(time_left=0, duration=1))
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=0, duration=1, progress=1.0)
+        )
+        finished.assert_called_once_with(Events.TIMER_END, payload=TimerPayload(time_left=0, duration=1, progress=1.0))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def boottime(self) -> float:
+        return self.now + self.slept
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    def suspend(self, seconds: float) -> None:
+        self.slept += seconds
+
+
+class TestTimerDeadline:
+    @pytest.fixture
+    def clock(self) -> Clock:
+        return Clock()
+
+    @pytest.fixture
+    def timeout_add(self, mocker):
+        mocker.patch("tomate.pomodoro.timer.GLib.source_remove")
+        return mocker.patch("tomate.pomodoro.timer.GLib.timeout_add", return_value=1)
+
+    def test_arms_timeout_to_the_next_second(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        bus.connect(Events.TIMER_UPDATE, mocker.Mock(), weak=False)
+
+        timer.start(60)
+
+        timeout_add.assert_called_once_with(1000, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_arms_timeout_to_the_deadline_without_update_receivers(self, bus, clock, config, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+
+        timer.start(30)
+
+        timeout_add.assert_called_once_with(30 * 1000, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_wakes_up_once_a_minute_without_update_receivers(self, bus, clock, config, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+
+        timer.start(25 * 60)
+
+        timeout_add.assert_called_once_with(60 * 1000, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_rearms_every_second_when_refreshed(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        timer.start(60)
+        clock.advance(10.5)
+
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+        timer.refresh()
+
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=50, duration=60, progress=10.5 / 60)
+        )
+        timeout_add.assert_called_with(500, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_sends_the_current_state_when_refreshed_in_the_same_tick(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        timer.start(60)
+        clock.advance(0.5)
+
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+        timer.refresh()
+
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=60, duration=60, progress=0.5 / 60)
+        )
+
+    def test_rearms_without_sending_when_refreshed_without_notify(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+        timer.start(60)
+        clock.advance(0.5)
+
+        bus.disconnect(Events.TIMER_UPDATE, changed)
+        timer.refresh(notify=False)
+
+        changed.assert_not_called()
+        timeout_add.assert_called_with(59500, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_computes_time_left_from_the_clock_when_callback_is_late(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+
+        timer.start(10)
+        clock.advance(3.5)
+        timer._update()
+
+        assert timer.time_left == 7
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=7, duration=10, progress=3.5 / 10)
+        )
+        timeout_add.assert_called_with(500, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_does_not_update_when_callback_is_early(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+
+        timer.start(10)
+        clock.advance(0.999)
+        timer._update()
+
+        assert timer.time_left == 10
+        changed.assert_not_called()
+        timeout_add.assert_called_with(1, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_ends_on_time_when_callbacks_are_delayed(self, bus, clock, config, mocker, timeout_add):
+        timer = Timer(bus, config, clock=clock)
+        finished = mocker.Mock()
+        bus.connect(Events.TIMER_END, finished, weak=False)
+
+        timer.start(5)
+        for delay in (1.7, 1.9, 1.4):
+            clock.advance(delay)
+            timer._update()
+
+        assert timer.is_running() is False
+        finished.assert_called_once_with(Events.TIMER_END, payload=TimerPayload(time_left=0, duration=5, progress=1.0))
+
+    def test_arms_timeout_to_the_next_interval(self, bus, clock, config, mocker, timeout_add):
+        config.set("timer", "interval", "250")
+        timer = Timer(bus, config, clock=clock)
+        bus.connect(Events.TIMER_UPDATE, mocker.Mock(), weak=False)
+
+        timer.start(10)
+        clock.advance(0.1)
+        timer._update()
+
+        timeout_add.assert_called_with(150, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_limits_the_interval_to_the_minimum(self, bus, clock, config, mocker, timeout_add):
+        config.set("timer", "interval", "1")
+        timer = Timer(bus, config, clock=clock)
+        bus.connect(Events.TIMER_UPDATE, mocker.Mock(), weak=False)
+
+        timer.start(10)
+
+        assert timer.interval == Timer.MIN_INTERVAL
+        timeout_add.assert_called_with(Timer.MIN_INTERVAL, timer._update, priority=GLib.PRIORITY_HIGH)
+
+    def test_updates_progress_every_interval(self, bus, clock, config, mocker, timeout_add):
+        config.set("timer", "interval", "250")
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+
+        timer.start(10)
+        for _ in range(4):
+            clock.advance(0.25)
+            timer._update()
+
+        assert [c.kwargs["payload"] for c in changed.call_args_list] == [
+            TimerPayload(time_left=10, duration=10, progress=0.025),
+            TimerPayload(time_left=10, duration=10, progress=0.05),
+            TimerPayload(time_left=10, duration=10, progress=0.075),
+            TimerPayload(time_left=9, duration=10, progress=0.1),
+        ]
+
+
+class TestTimerSuspend:
+    @pytest.fixture
+    def clock(self) -> Clock:
+        return Clock()
+
+    @pytest.fixture(autouse=True)
+    def timeout_add(self, mocker):
+        return mocker.patch("tomate.pomodoro.timer.GLib.timeout_add", return_value=1)
+
+    def test_jumps_time_left_in_one_step_after_resume(self, bus, clock, config, mocker):
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+
+        timer.start(60)
+        clock.suspend(30)
+        clock.advance(1)
+        timer._update()
+
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=29, duration=60, progress=31 / 60)
+        )
+
+    def test_ends_right_away_when_deadline_passed_during_suspend(self, bus, clock, config, mocker):
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+        finished = mocker.Mock()
+        bus.connect(Events.TIMER_END, finished, weak=False)
+
+        timer.start(60)
+        clock.suspend(3600)
+        clock.advance(1)
+        timer._update()
+
+        assert timer.is_running() is False
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=0, duration=60, progress=1.0)
+        )
+        finished.assert_called_once_with(Events.TIMER_END, payload=TimerPayload(time_left=0, duration=60, progress=1.0))
+
+    def test_pauses_during_suspend_without_catch_up(self, bus, clock, config, mocker):
+        config.set("timer", "catch_up", "false")
+        timer = Timer(bus, config, clock=clock)
+        changed = mocker.Mock()
+        bus.connect(Events.TIMER_UPDATE, changed, weak=False)
+
+        timer.start(60)
+        clock.suspend(30)
+        clock.advance(1)
+        timer._update()
+
+        changed.assert_called_once_with(
+            Events.TIMER_UPDATE, payload=TimerPayload(time_left=59, duration=60, progress=1 / 60)
+        )
 
 
 class TestTimerPayload:
@@ -159,3 +391,30 @@ class TestTimerPayload:
         payload = TimerPayload(time_left=seconds, duration=0)
 
         assert payload.countdown == formatted
+
+    def test_formats_countdown_once_for_all_receivers(self, bus, mocker):
+        format_seconds = mocker.patch("tomate.pomodoro.timer.format_seconds", return_value="00:10")
+        receivers = [mocker.Mock(side_effect=lambda _, payload: payload.countdown) for _ in range(3)]
+        for receiver in receivers:
+            bus.connect(Events.TIMER_UPDATE, receiver, weak=False)
+
+        result = bus.send(Events.TIMER_UPDATE, payload=TimerPayload(time_left=10, duration=60))
+
+        assert result == ["00:10", "00:10", "00:10"]
+        format_seconds.assert_called_once_with(10)
+
+
+class TestFormatSeconds:
+    @pytest.mark.parametrize(
+        "seconds,formatted",
+        [(0, "00:00"), (59, "00:59"), (99 * 60 + 59, "99:59"), (2 * 60 * 60 + 1, "120:01"), (-1, "-1:59")],
+    )
+    def test_formats_seconds(self, seconds, formatted):
+        assert format_seconds(seconds) == formatted
+
+    def test_returns_the_same_string_for_the_same_seconds(self):
+        assert format_seconds(25 * 60) is format_seconds(25 * 60)
+
+    def test_does_not_grow_the_table_past_the_limit(self):
+        assert format_seconds(_COUNTDOWN_LIMIT + 1) == "240:01"
+        assert len(_COUNTDOWN) <= _COUNTDOWN_LIMIT
@@ -2,14 +2,15 @@ import pytest
 from gi.repository import Gdk, Gtk
 from wiring.scanning import scan_to_graph
 
-from tomate.pomodoro import Events
+from tomate.pomodoro import Events, Timer
 from tomate.ui import Systray, Window
 from tomate.ui.testing import Q, active_shortcut, create_session_payload
 
 
 @pytest.fixture
-def window(bus, config, graph, session) -> Window:
+def window(bus, config, graph, mocker, session) -> Window:
     graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.timer", mocker.Mock(spec=Timer))
     graph.register_instance("tomate.config", config)
     graph.register_instance("tomate.session", session)
 
@@ -113,3 +114,32 @@ def test_shows_window_when_session_end(bus, mocker, window):
 
     assert window.widget.props.visible is True
     subscriber.assert_called_once_with(Events.WINDOW_SHOW, payload=None)
+
+
+class TestWindowVisibility:
+    def test_pauses_countdown_while_iconified(self, bus, mocker, window):
+        window._on_map(window.widget, True)
+        window._on_window_state(window.widget, mocker.Mock(new_window_state=Gdk.WindowState.ICONIFIED))
+
+        assert bus.has_receivers(Events.TIMER_UPDATE) is False
+
+    def test_resumes_countdown_when_restored_from_the_taskbar(self, bus, mocker, window):
+        window._on_map(window.widget, True)
+        window._on_window_state(window.widget, mocker.Mock(new_window_state=Gdk.WindowState.ICONIFIED))
+        window._on_window_state(window.widget, mocker.Mock(new_window_state=Gdk.WindowState.FOCUSED))
+
+        assert bus.has_receivers(Events.TIMER_UPDATE) is True
+
+    def test_pauses_countdown_while_unmapped(self, bus, window):
+        window._on_map(window.widget, True)
+        window._on_map(window.widget, False)
+
+        assert bus.has_receivers(Events.TIMER_UPDATE) is False
+
+
+def test_clears_config_cache_when_icon_theme_changes(config, mocker, window):
+    clear_cache = mocker.spy(config, "clear_cache")
+
+    Gtk.IconTheme.get_default().emit("changed")
+
+    clear_cache.assert_called_once_with()
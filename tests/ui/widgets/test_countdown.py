@@ -3,14 +3,20 @@ import random
 import pytest
 from wiring.scanning import scan_to_graph
 
-from tomate.pomodoro import Events, TimerPayload
+from tomate.pomodoro import Events, Timer, TimerPayload
 from tomate.ui.testing import create_session_payload
 from tomate.ui.widgets import Countdown
 
 
 @pytest.fixture
-def countdown(bus, graph) -> Countdown:
+def timer(mocker):
+    return mocker.Mock(spec=Timer)
+
+
+@pytest.fixture
+def countdown(bus, graph, timer) -> Countdown:
     graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.timer", timer)
     scan_to_graph(["tomate.ui.widgets.countdown"], graph)
     return graph.get("tomate.ui.countdown")
 
@@ -35,3 +41,45 @@ def test_updates_countdown_when_session_state_changes(event, payload, bus, count
     bus.send(event, payload=payload)
 
     assert payload.countdown in countdown.widget.get_text()
+
+
+def test_stops_receiving_timer_updates_while_hidden(bus, countdown, timer):
+    countdown.set_visible(False)
+
+    assert bus.has_receivers(Events.TIMER_UPDATE) is False
+    timer.refresh.assert_called_once_with(notify=False)
+
+
+def test_asks_for_the_current_state_when_visible_again(bus, countdown, timer):
+    countdown.set_visible(False)
+    timer.reset_mock()
+
+    countdown.set_visible(True)
+    bus.emit(Events.TIMER_UPDATE, payload=TimerPayload(time_left=10, duration=60))
+
+    timer.refresh.assert_called_once_with(notify=True)
+    assert countdown.widget.get_text() == "00:10"
+
+
+def test_ignores_unchanged_visibility(countdown, timer):
+    countdown.set_visible(True)
+
+    timer.refresh.assert_not_called()
+
+
+def test_redraws_only_when_the_second_changes(bus, countdown):
+    bus.emit(Events.TIMER_UPDATE, payload=TimerPayload(time_left=10, duration=60, progress=0.825))
+    countdown.widget.set_text("")
+
+    bus.emit(Events.TIMER_UPDATE, payload=TimerPayload(time_left=10, duration=60, progress=0.83))
+    assert countdown.widget.get_text() == ""
+
+    bus.emit(Events.TIMER_UPDATE, payload=TimerPayload(time_left=9, duration=60, progress=0.85))
+    assert countdown.widget.get_text() == "00:09"
+
+
+def test_reuses_the_markup_for_the_same_countdown():
+    markup = Countdown.timer_markup("25:00")
+
+    assert markup == '<span face="sans-serif" font="45">25:00</span>'
+    assert Countdown.timer_markup("25:00") is markup
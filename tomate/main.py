@@ -13,6 +13,7 @@ from wiring.scanning import scan_to_graph
 
 from tomate.pomodoro.app import Application
 from tomate.pomodoro.graph import graph
+from tomate.pomodoro.plugin import in_debug_mode
 
 locale.textdomain("tomate")
 logger = logging.getLogger(__name__)
@@ -24,6 +25,9 @@ def main():
         setup_logging(options)
 
         scan_to_graph(["tomate"], graph)
+        if options.stats or in_debug_mode():
+            graph.get("tomate.bus").instrument()
+
         app = Application.from_graph(graph)
 
         app.Run()
@@ -52,4 +56,12 @@ def parse_options():
         help=_("Show debug messages"),
     )
 
+    parser.add_argument(
+        "-s",
+        "--stats",
+        default=False,
+        action="store_true",
+        help=_("Record the time spent by each event receiver"),
+    )
+
     return parser.parse_args()
@@ -1,12 +1,17 @@
 import enum
+import logging
 
 import dbus.service
 from dbus.mainloop.glib import DBusGMainLoop
 from wiring import SingletonScope, inject
 from wiring.scanning import register
 
+from .config import Config
+from .event import Bus
 from .plugin import PluginEngine
 
+logger = logging.getLogger(__name__)
+
 
 class State(enum.Enum):
     STOPPED = 1
@@ -20,12 +25,22 @@ class Application(dbus.service.Object):
     BUS_INTERFACE = "com.github.Tomate"
     SPEC = "tomate.app"
 
-    @inject(bus="dbus.session", window="tomate.ui.view", plugins="tomate.plugin")
-    def __init__(self, bus, window, plugins: PluginEngine):
+    @inject(
+        bus="dbus.session",
+        events="tomate.bus",
+        config="tomate.config",
+        window="tomate.ui.view",
+        plugins="tomate.plugin",
+    )
+    def __init__(self, bus, events: Bus, config: Config, window, plugins: PluginEngine):
         dbus.service.Object.__init__(self, bus, self.BUS_PATH)
         self.state = State.STOPPED
+        self._events = events
+        self._config = config
+        config.watch()
         self._window = window
         plugins.collect()
+        plugins.watch()
 
     @dbus.service.method(BUS_INTERFACE, out_signature="b")
     def IsRunning(self):
@@ -38,15 +53,30 @@ class Application(dbus.service.Object):
         else:
             self.state = State.STARTED
             self._window.run()
+            self._quit()
 
         return True
 
+    @dbus.service.method(BUS_INTERFACE, out_signature="a(ssudd)")
+    def Stats(self):
+        return self._events.stats()
+
+    def _quit(self) -> None:
+        self._config.flush()
+
+        for event, receiver, calls, total, worst in self._events.stats():
+            logger.info(
+                "action=stats event=%s receiver=%s calls=%d total=%.6f worst=%.6f", event, receiver, calls, total, worst
+            )
+
     @classmethod
     def from_graph(cls, graph, bus=dbus.SessionBus(mainloop=DBusGMainLoop())):
         request = bus.request_name(cls.BUS_NAME, dbus.bus.NAME_FLAG_DO_NOT_QUEUE)
 
         if request != dbus.bus.REQUEST_NAME_REPLY_EXISTS:
             graph.register_instance("dbus.session", bus)
+            # the plugins are imported in the background while the window is built
+            graph.get("tomate.plugin").prefetch()
             instance = graph.get(cls.SPEC)
         else:
             bus_object = bus.get_object(cls.BUS_NAME, cls.BUS_PATH)
@@ -1,9 +1,16 @@
+import contextlib
+import functools
+import hashlib
+import io
 import logging
 import os
+import stat
+import tempfile
 from collections import namedtuple
-from configparser import RawConfigParser
-from typing import List, Union
+from configparser import Error, RawConfigParser
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
+from gi.repository import Gio, GLib
 from wiring import SingletonScope, inject
 from wiring.scanning import register
 from xdg import BaseDirectory, IconTheme
@@ -12,7 +19,35 @@ from .event import Bus, Events
 
 logger = logging.getLogger(__name__)
 
-Payload = namedtuple("ConfigPayload", "action section option value")
+Key = Tuple[str, str]
+
+
+class Payload(namedtuple("ConfigPayload", "action section option value batch", defaults=[()])):
+    """
+    A transaction sends one payload with the batch action and its changes in batch. The section is set when all the
+    changes are in the same section.
+    """
+
+    @property
+    def changes(self) -> Tuple["Payload", ...]:
+        return self.batch or (self,)
+
+    @property
+    def keys(self) -> Tuple[Key, ...]:
+        return tuple((change.section, change.option) for change in self.changes)
+
+    def touches(self, section: str) -> bool:
+        return any(change.section == section for change in self.changes)
+
+    @classmethod
+    def of(cls, changes: List["Payload"]) -> "Payload":
+        sections = {change.section for change in changes}
+        section = sections.pop() if len(sections) == 1 else ""
+        return cls(action="batch", section=section, option="", value="", batch=tuple(changes))
+
+
+# cached for options not found, the caller fallback is returned instead
+MISSING = object()
 
 
 @register.factory("tomate.config", scope=SingletonScope)
@@ -29,11 +64,30 @@ class Config:
         DURATION_LONG_BREAK: "15",
         "long_break_interval": "4",
     }
+    # milliseconds the changes are held in memory before they are written together
+    SAVE_DELAY = 500
+    # permissions of a new config file
+    FILE_MODE = 0o666
+    PATH_CACHE_SIZE = 128
 
     @inject(bus="tomate.bus")
-    def __init__(self, bus: Bus, parser=RawConfigParser(defaults=DEFAULTS, strict=True)):
-        self.parser = parser
+    def __init__(self, bus: Bus, parser: Optional[RawConfigParser] = None):
+        self.parser = parser if parser is not None else RawConfigParser(defaults=Config.DEFAULTS, strict=True)
         self._bus = bus
+        # converted values by normalized (section, option) and parser method, filled on first read
+        self._values: Dict[Key, Dict[str, Any]] = {}
+        self._keys: Dict[Key, Key] = {}
+        self._save_source = 0
+        self._changes: Optional[List[Payload]] = None
+        # memo of the file system lookups, cleared when the icon theme changes
+        self._config_path: Optional[str] = None
+        self._find_resource = functools.lru_cache(maxsize=self.PATH_CACHE_SIZE)(self._resource_path)
+        self._find_icon = functools.lru_cache(maxsize=self.PATH_CACHE_SIZE)(find_icon)
+        # last content read or written, external changes are diffed against it
+        self._content = ""
+        self._digest = b""
+        self._mtime = 0
+        self._monitor: Optional[Gio.FileMonitor] = None
         self.load()
 
     def __getattr__(self, attr):
@@ -42,20 +96,146 @@ class Config:
     def load(self) -> None:
         logger.debug("action=load uri=%s", self.config_path())
 
-        self.parser.read(self.config_path())
+        # the file is older than the changes not written yet
+        self.flush()
+        content = self._read_file()
+        if content is None:
+            self._remember("")
+            self._mtime = 0
+        else:
+            self.parser.read_string(content, source=self.config_path())
+            self._remember(content)
+        self._values.clear()
+
+    def watch(self) -> None:
+        logger.debug("action=watch uri=%s", self.config_path())
+
+        self._monitor = Gio.File.new_for_path(self.config_path()).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self._monitor.connect("changed", self._on_file_changed)
+
+    def _on_file_changed(self, _monitor, _file, _other_file, event: Gio.FileMonitorEvent) -> None:
+        if event in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED):
+            self.reload()
+
+    def reload(self) -> None:
+        """
+        Applies the changes made to the file by other programs and sends a CONFIG_CHANGE with the changed options.
+        """
+        previous = self._content
+        content = self._read_file()
+        if content is None or content == previous:
+            return
+
+        try:
+            changes = diff(snapshot(previous), snapshot(content))
+        except Error as error:
+            logger.warning("action=reload uri=%s error=%s", self.config_path(), error)
+            return
+
+        self._remember(content)
+        logger.debug("action=reload uri=%s changes=%d", self.config_path(), len(changes))
+
+        for change in changes:
+            if change.action == "set":
+                if change.section != self.parser.default_section and not self.parser.has_section(change.section):
+                    self.parser.add_section(change.section)
+                self.parser.set(change.section, change.option, change.value)
+            elif self.parser.has_option(change.section, change.option):
+                self.parser.remove_option(change.section, change.option)
+
+        # the default section changes the options of all sections
+        self._values.clear()
+
+        if changes:
+            self._bus.emit(Events.CONFIG_CHANGE, payload=changes[0] if len(changes) == 1 else Payload.of(changes))
+
+    def _read_file(self) -> Optional[str]:
+        path = self.config_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            # the same modification time means nothing changed, like after our own writes
+            if mtime == self._mtime:
+                return self._content
+
+            with open(path) as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+
+        self._mtime = mtime
+        # a new modification time with the same digest is a write without changes
+        if hashlib.sha1(content.encode()).digest() == self._digest:
+            return self._content
+
+        return content
+
+    def _remember(self, content: str) -> None:
+        self._content = content
+        self._digest = hashlib.sha1(content.encode()).digest()
 
     def save(self) -> None:
-        logger.debug("action=write uri=%s", self.config_path())
+        if not self._save_source:
+            logger.debug("action=schedule_write delay=%d", self.SAVE_DELAY)
+            self._save_source = GLib.timeout_add(self.SAVE_DELAY, self._on_save_timeout)
+
+    def flush(self) -> None:
+        if self._save_source:
+            GLib.source_remove(self._save_source)
+            self._save_source = 0
+            self._write()
+
+    def _on_save_timeout(self) -> bool:
+        self._save_source = 0
+        self._write()
+        return GLib.SOURCE_REMOVE
+
+    def _write(self) -> None:
+        path = self.config_path()
+        logger.debug("action=write uri=%s", path)
+
+        buffer = io.StringIO()
+        self.parser.write(buffer)
+        content = buffer.getvalue()
+
+        # readers never see a half written file, the temporary file replaces it in one step. A symlinked config
+        # keeps its link, the temporary file replaces the target instead
+        real_path = os.path.realpath(path)
+        fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(real_path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                # mkstemp creates the file readable by the owner only
+                os.fchmod(f.fileno(), self._mode(real_path))
+                f.write(content)
+            os.replace(temp_path, real_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        # the watcher ignores the file while it has the content written here
+        self._remember(content)
+        self._mtime = os.stat(path).st_mtime_ns
 
-        with open(self.config_path(), "w") as f:
-            self.parser.write(f)
+    @staticmethod
+    def _mode(path: str) -> int:
+        try:
+            return stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            # same mode as open() gives a new file, setting the umask is the only way to read it
+            umask = os.umask(0)
+            os.umask(umask)
+            return Config.FILE_MODE & ~umask
 
     def config_path(self) -> str:
-        BaseDirectory.save_config_path(self.APP_NAME)
-        return os.path.join(BaseDirectory.xdg_config_home, self.APP_NAME, self.APP_NAME + ".conf")
+        if self._config_path is None:
+            BaseDirectory.save_config_path(self.APP_NAME)
+            self._config_path = os.path.join(BaseDirectory.xdg_config_home, self.APP_NAME, self.APP_NAME + ".conf")
+        return self._config_path
+
+    def cache_path(self, name: str) -> str:
+        return os.path.join(BaseDirectory.save_cache_path(self.APP_NAME), name)
 
     def media_uri(self, *resources: str) -> str:
-        return "file://" + self._resource_path(self.APP_NAME, "media", *resources)
+        return "file://" + self._find_resource(self.APP_NAME, "media", *resources)
 
     def plugin_paths(self) -> List[str]:
         return remove_duplicates(self._load_data_paths(self.APP_NAME, "plugins"))
@@ -74,13 +254,18 @@ class Config:
         return [path for path in BaseDirectory.load_data_paths(*resources)]
 
     def icon_path(self, iconname, size=None, theme=None) -> str:
-        icon_path = IconTheme.getIconPath(iconname, size, theme, extensions=["png", "svg", "xpm"])
+        icon_path = self._find_icon(iconname, size, theme)
 
         if icon_path is not None:
             return icon_path
 
         raise EnvironmentError("Icon '%s' not found!" % iconname)
 
+    def clear_cache(self) -> None:
+        logger.debug("action=clear_cache icons=%s", self._find_icon.cache_info())
+        self._find_resource.cache_clear()
+        self._find_icon.cache_clear()
+
     def get_int(self, section: str, option: str, fallback=None) -> int:
         return self.get(section, option, fallback, method="getint")
 
@@ -91,14 +276,37 @@ class Config:
         return self.get(section, option, fallback, method="getfloat")
 
     def get(self, section: str, option: str, fallback=None, method="get") -> Union[str, int, bool]:
-        section = self.normalize(section)
-        option = self.normalize(option)
+        key = self._key(section, option)
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = {}
+
+        try:
+            value = values[method]
+        except KeyError:
+            value = values[method] = self._read(key, method)
+
+        return fallback if value is MISSING else value
+
+    def _read(self, key: Key, method: str) -> Any:
+        section, option = key
+        logger.debug("action=read section=%s option=%s method=%s", section, option, method)
+
+        # missing sections are not added on read, their options come from the defaults
         if not self.parser.has_section(section):
-            self.parser.add_section(section)
+            section = self.parser.default_section
 
-        logger.debug("action=get section=%s option=%s", section, option)
+        if not self.parser.has_option(section, option):
+            return MISSING
 
-        return getattr(self.parser, method)(section, option, fallback=fallback)
+        return getattr(self.parser, method)(section, option)
+
+    def _key(self, section: str, option: str) -> Key:
+        try:
+            return self._keys[section, option]
+        except KeyError:
+            key = self._keys[section, option] = (self.normalize(section), self.normalize(option))
+            return key
 
     def set(self, section: str, option: str, value) -> None:
         logger.debug("action=set section=%s option=%s value=%s", section, option, value)
@@ -108,26 +316,78 @@ class Config:
         if not self.parser.has_section(section):
             self.parser.add_section(section)
         self.parser.set(section, option, value)
-        self.save()
-
-        payload = Payload(action="set", section=section, option=option, value=value)
-        self._bus.send(Events.CONFIG_CHANGE, payload=payload)
+        self._values.pop((section, option), None)
+        self._changed(Payload(action="set", section=section, option=option, value=value))
 
     def remove(self, section, option) -> None:
         logger.debug("action=remove section=%s option=%s", section, option)
 
         section = self.normalize(section)
         option = self.normalize(option)
-        self.parser.remove_option(section, option)
-        self.save()
-
-        payload = Payload(action="remove", section=section, option=option, value="")
-        self._bus.send(Events.CONFIG_CHANGE, payload=payload)
+        if self.parser.has_section(section):
+            self.parser.remove_option(section, option)
+        self._values.pop((section, option), None)
+        self._changed(Payload(action="remove", section=section, option=option, value=""))
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["Config"]:
+        """
+        Holds the changes made inside the block and sends them in one CONFIG_CHANGE when it exits, nested transactions
+        join the outer one.
+        """
+        if self._changes is not None:
+            yield self
+            return
+
+        logger.debug("action=begin_transaction")
+        self._changes = []
+        try:
+            yield self
+        finally:
+            changes, self._changes = self._changes, None
+            logger.debug("action=end_transaction changes=%d", len(changes))
+
+            if changes:
+                self.save()
+                self._bus.emit(Events.CONFIG_CHANGE, payload=Payload.of(changes))
+
+    def _changed(self, payload: Payload) -> None:
+        if self._changes is not None:
+            self._changes.append(payload)
+        else:
+            self.save()
+            self._bus.emit(Events.CONFIG_CHANGE, payload=payload)
 
     @staticmethod
     def normalize(name: str) -> str:
         return name.replace(" ", "_").lower()
 
 
+def snapshot(content: str) -> Dict[Key, str]:
+    # the default section is read as a regular section, the options of each section are only their own
+    parser = RawConfigParser(default_section="")
+    parser.read_string(content)
+    return {(section, option): value for section in parser.sections() for option, value in parser.items(section)}
+
+
+def diff(previous: Dict[Key, str], current: Dict[Key, str]) -> List[Payload]:
+    changes = [
+        Payload(action="set", section=section, option=option, value=value)
+        for (section, option), value in current.items()
+        if previous.get((section, option)) != value
+    ]
+    changes.extend(
+        Payload(action="remove", section=section, option=option, value="")
+        for section, option in previous
+        if (section, option) not in current
+    )
+    return changes
+
+
+def find_icon(iconname: str, size: Optional[int], theme: Optional[str]) -> Optional[str]:
+    return IconTheme.getIconPath(iconname, size, theme, extensions=["png", "svg", "xpm"])
+
+
 def remove_duplicates(original: List[str]) -> List[str]:
-    return list(set(original))
+    # keeps the first occurrence, the XDG directories come in precedence order
+    return list(dict.fromkeys(original))
@@ -1,9 +1,11 @@
 import enum
 import functools
 import logging
-from typing import Any, Callable, List, Tuple
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import blinker
+from gi.repository import GLib
 from wiring import SingletonScope
 from wiring.scanning import register
 
@@ -29,57 +31,274 @@ class Events(enum.Enum):
 
     CONFIG_CHANGE = 12
 
+    SCRIPT_EXIT = 13
+
+
+class Priority(enum.IntEnum):
+    # like in GLib, lower values run first
+    HIGH = -100
+    DEFAULT = 0
+    LOW = 100
+
 
 Receiver = Callable[[Events, Any], Any]
+Handler = Callable[..., Any]
+
+# only the latest payload of these events matters to a deferred receiver
+COALESCED_EVENTS = frozenset([Events.TIMER_UPDATE])
+
+
+class Deferred:
+    """
+    Delivers the payloads to the handler from the GLib idle queue, at low priority.
+    """
+
+    def __init__(self, event: Events, handler: Handler):
+        self._handler = handler
+        self._coalesce = event in COALESCED_EVENTS
+        self._payloads = deque()
+        self._source = 0
+
+    def __call__(self, payload: Any = None) -> None:
+        if self._coalesce:
+            self._payloads.clear()
+
+        self._payloads.append(payload)
+
+        if not self._source:
+            self._source = GLib.idle_add(self._deliver, priority=GLib.PRIORITY_LOW)
+
+    def _deliver(self) -> bool:
+        self._source = 0
+
+        while self._payloads:
+            self._handler(payload=self._payloads.popleft())
+
+        return GLib.SOURCE_REMOVE
+
+    def cancel(self) -> None:
+        if self._source:
+            GLib.source_remove(self._source)
+            self._source = 0
+
+        self._payloads.clear()
+
+
+class Stats:
+    __slots__ = ("calls", "total", "worst")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = self.worst = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.worst:
+            self.worst = elapsed
+
+
+class Timed:
+    """
+    Records the time spent in the handler, only used when the bus is instrumented.
+    """
+
+    def __init__(self, handler: Handler, stats: Stats):
+        self._handler = handler
+        self._stats = stats
+
+    def __call__(self, payload: Any = None) -> Any:
+        start = time.perf_counter()
+        try:
+            return self._handler(payload=payload)
+        finally:
+            self._stats.record(time.perf_counter() - start)
 
 
 @register.factory("tomate.bus", scope=SingletonScope)
 class Bus:
+    """
+    Keeps a precompiled tuple of receivers per event, rebuilt only on connect and disconnect.
+    Receivers are held strongly until they are disconnected, weak is kept for backward compatibility.
+
+    Methods decorated with @on receive only the payload, any other receiver also receives the event.
+    Receivers run by priority and, with the same priority, in the order they were connected.
+    Deferred receivers are called later from the GLib idle queue and always return None to send.
+    """
+
     def __init__(self):
-        self._bus = blinker.NamedSignal("tomate")
+        self._receivers: Dict[Events, Dict[Receiver, Tuple[int, bool, Handler]]] = {}
+        self._dispatch: Dict[Events, Tuple[Handler, ...]] = {}
+        self._stats: Optional[Dict[Tuple[str, str], Stats]] = None
+
+    def connect(
+        self,
+        event: Events,
+        receiver: Receiver,
+        weak: bool = True,
+        priority: int = Priority.DEFAULT,
+        deferred: bool = False,
+    ):
+        receivers = self._receivers.setdefault(event, {})
+
+        if receiver in receivers:
+            if receivers[receiver][:2] == (priority, deferred):
+                return
 
-    def connect(self, event: Events, receiver: Receiver, weak: bool = True):
-        self._bus.connect(receiver, sender=event, weak=weak)
+            self.disconnect(event, receiver)
+
+        receivers[receiver] = (priority, deferred, self._create_handler(event, receiver, deferred))
+        self._compile(event)
 
     def is_connect(self, event: Events, receiver: Receiver) -> bool:
-        return receiver in self._bus.receivers_for(event)
+        return receiver in self._receivers.get(event, ())
+
+    def has_receivers(self, event: Events) -> bool:
+        return bool(self._dispatch.get(event))
 
     def send(self, event: Events, payload: Any = None) -> List[Any]:
-        # ignore the receiver in the result
-        return [result[1] for result in self._bus.send(event, payload=payload)]
+        return [handler(payload=payload) for handler in self._dispatch.get(event, ())]
+
+    def emit(self, event: Events, payload: Any = None) -> None:
+        # same as send but without collecting the results
+        for handler in self._dispatch.get(event, ()):
+            handler(payload=payload)
 
     def disconnect(self, event: Events, receiver: Receiver):
-        self._bus.disconnect(receiver, sender=event)
+        receivers = self._receivers.get(event, {})
 
+        if receiver in receivers:
+            _, _, handler = receivers.pop(receiver)
+            cancel(handler)
+            self._compile(event)
 
-def on(*events: Events):
-    def wrapper(method):
-        method._events = events
+    def disconnect_module(self, module: str) -> int:
+        """
+        Disconnects every receiver defined in the module, returns how many were disconnected.
+        """
+        count = 0
+        for event, receivers in self._receivers.items():
+            stale = [receiver for receiver in receivers if getattr(receiver, "__module__", None) == module]
+            for receiver in stale:
+                self.disconnect(event, receiver)
+            count += len(stale)
+
+        return count
+
+    def instrument(self) -> None:
+        """
+        Records the calls, total and worst time of each (event, receiver) from now on.
+        """
+        if self._stats is not None:
+            return
+
+        logger.debug("action=instrument")
+        self._stats = {}
+
+        for event, receivers in self._receivers.items():
+            for receiver, (priority, deferred, handler) in list(receivers.items()):
+                cancel(handler)
+                receivers[receiver] = (priority, deferred, self._create_handler(event, receiver, deferred))
+
+            self._compile(event)
+
+    def stats(self) -> List[Tuple[str, str, int, float, float]]:
+        if not self._stats:
+            return []
+
+        rows = [(event, receiver, s.calls, s.total, s.worst) for (event, receiver), s in self._stats.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def _create_handler(self, event: Events, receiver: Receiver, deferred: bool) -> Handler:
+        handler = handler_of(event, receiver)
+
+        if self._stats is not None:
+            stats = self._stats.setdefault((event.name, name_of(receiver)), Stats())
+            handler = Timed(handler, stats)
+
+        return Deferred(event, handler) if deferred else handler
+
+    def _compile(self, event: Events) -> None:
+        # sorted is stable, receivers with the same priority keep the connection order
+        receivers = sorted(self._receivers[event].values(), key=lambda item: item[0])
+        self._dispatch[event] = tuple(handler for _, _, handler in receivers)
+        logger.debug("action=compile event=%s receivers=%d", event, len(self._dispatch[event]))
+
+
+def cancel(handler: Handler) -> None:
+    if isinstance(handler, Deferred):
+        handler.cancel()
 
-        @functools.wraps(method)
-        def wrapped(*args, **kwargs):
-            # ignore the event type, Events, in the receiver callback
-            return method(*(arg for arg in args if not isinstance(arg, Events)), **kwargs)
 
-        return wrapped
+def name_of(receiver: Receiver) -> str:
+    qualname = getattr(receiver, "__qualname__", None)
+    if qualname is None:
+        return repr(receiver)
+
+    # the methods of each instance get their own stats row
+    owner = getattr(receiver, "__self__", receiver)
+    return "%s.%s at 0x%x" % (getattr(receiver, "__module__", None), qualname, id(owner))
+
+
+def handler_of(event: Events, receiver: Receiver) -> Handler:
+    if is_handler(receiver):
+        return receiver
+
+    # binds the event once so plain receivers keep the (event, payload) signature
+    return functools.partial(receiver, event)
+
+
+def is_handler(receiver: Receiver) -> bool:
+    return isinstance(getattr(receiver, "_events", None), tuple)
+
+
+def on(*events: Events, priority: int = Priority.DEFAULT):
+    def wrapper(method):
+        # the method is returned as is, the bus calls it directly with the payload
+        method._events = events
+        method._priority = priority
+        return method
 
     return wrapper
 
 
 class Subscriber:
+    # (method name, events, priority) collected from the @on methods when the class is defined
+    _handlers: Tuple[Tuple[str, Tuple[Events, ...], int], ...] = ()
+
+    # when true the handlers run from the GLib idle queue instead of inside the sender
+    deferred = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        handlers = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                events = getattr(attr, "_events", None)
+                if isinstance(events, tuple):
+                    handlers[name] = (name, events, getattr(attr, "_priority", Priority.DEFAULT))
+                else:
+                    # an override without @on stops receiving events
+                    handlers.pop(name, None)
+
+        cls._handlers = tuple(handlers.values())
+
     def connect(self, bus: Bus) -> None:
-        for method, events in self.__methods_with_events():
+        for method, events, priority in self.__methods_with_events():
             for event in events:
                 logger.debug(
-                    "action=connect event=%s method=%s.%s",
+                    "action=connect event=%s method=%s.%s priority=%d deferred=%s",
                     event,
                     self.__class__.__name__,
                     method.__name__,
+                    priority,
+                    self.deferred,
                 )
-                bus.connect(event, method)
+                bus.connect(event, method, priority=priority, deferred=self.deferred)
 
     def disconnect(self, bus: Bus):
-        for method, events in self.__methods_with_events():
+        for method, events, _ in self.__methods_with_events():
             for event in events:
                 logger.debug(
                     "action=disconnect event=%s method=%s.%s",
@@ -89,9 +308,5 @@ class Subscriber:
                 )
                 bus.disconnect(event, method)
 
-    def __methods_with_events(self) -> List[Tuple[Any, List[Events]]]:
-        return [
-            (getattr(self, attr), getattr(getattr(self, attr), "_events"))
-            for attr in dir(self)
-            if hasattr(getattr(self, attr), "_events")
-        ]
+    def __methods_with_events(self) -> List[Tuple[Any, Tuple[Events, ...], int]]:
+        return [(getattr(self, name), events, priority) for name, events, priority in self._handlers]
@@ -0,0 +1,306 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import traceback
+from concurrent import futures
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional, Tuple
+
+from gi.repository import GLib
+from wiring import Graph
+from yapsy.PluginInfo import PluginInfo
+
+from .config import Config
+from .event import Bus, Events
+from .plugin import LazyPlugin, Plugin
+
+logger = logging.getLogger(__name__)
+
+SECTION_NAME = "Host"
+
+
+class IsolatedPlugin:
+    """
+    Runs the plugin in a child process. The events the plugin handles are forwarded to the child and the results are
+    logged when they come back. A child that exits or takes longer than the plugin timeout to handle an event is
+    killed and started again, up to MAX_RESTARTS times in a row.
+    """
+
+    TIMEOUT = 5000
+    MAX_RESTARTS = 3
+    # the child has its own config, it reads the changes from the file
+    LOCAL_EVENTS = (Events.CONFIG_CHANGE,)
+
+    has_settings = False
+
+    def __init__(self, info: PluginInfo, filepath: str):
+        self._info = info
+        self._filepath = filepath
+        self._timeout = info.details.getint(SECTION_NAME, "Timeout", fallback=self.TIMEOUT)
+        self._activated = False
+        self._restarts = 0
+        self._process: Optional[multiprocessing.Process] = None
+        self._connection: Optional[Connection] = None
+        self._watch = 0
+        self._events: Tuple[Events, ...] = ()
+        # timeout source by request id, removed when the child answers
+        self._pending: Dict[int, int] = {}
+        self._requests = itertools.count()
+        self.bus = None
+        self.graph = None
+
+    @staticmethod
+    def accepts(info: PluginInfo) -> bool:
+        # plugins with settings build their dialogs in the main process
+        return info.details.getboolean(SECTION_NAME, "Isolated", fallback=False) and not info.details.getboolean(
+            "Documentation", "HasSettings", fallback=False
+        )
+
+    def configure(self, bus: Bus, graph: Graph) -> None:
+        self.bus = bus
+        self.graph = graph
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._process is not None
+
+    @property
+    def is_activated(self) -> bool:
+        return self._activated
+
+    def activate(self) -> None:
+        self._activated = True
+        self._restarts = 0
+        self._start()
+
+    def deactivate(self) -> None:
+        self._activated = False
+        self._stop(graceful=True)
+
+    def prefetch(self, _executor: futures.Executor) -> futures.Future:
+        # the module is imported by the child
+        future = futures.Future()
+        future.set_result(None)
+        return future
+
+    def owns(self, path: str) -> bool:
+        return path == self._filepath + ".py" or path.startswith(self._filepath + os.sep)
+
+    def unload(self) -> Optional[str]:
+        self.deactivate()
+        self._info.error = None
+        return None
+
+    def settings_window(self, _parent) -> None:
+        return None
+
+    def _start(self) -> None:
+        logger.debug("action=start plugin=%s timeout=%d", self._info.name, self._timeout)
+
+        context = multiprocessing.get_context("spawn")
+        self._connection, child = context.Pipe()
+        self._process = context.Process(
+            target=serve,
+            args=(child, self._info.name, self._filepath, logging.getLogger().getEffectiveLevel()),
+            name="tomate-plugin-" + self._info.name,
+            daemon=True,
+        )
+        self._process.start()
+        child.close()
+
+        self._watch = GLib.io_add_watch(
+            self._connection.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self._on_message
+        )
+
+    def _stop(self, graceful: bool = False) -> None:
+        for event in self._events:
+            self.bus.disconnect(event, self._forward)
+        self._events = ()
+
+        for source in self._pending.values():
+            GLib.source_remove(source)
+        self._pending.clear()
+
+        if self._watch:
+            GLib.source_remove(self._watch)
+            self._watch = 0
+
+        if self._process is None:
+            return
+
+        process, connection = self._process, self._connection
+        self._process = None
+        self._connection = None
+
+        if graceful:
+            try:
+                # lets the plugin clean up before the child exits, it is killed when it takes longer than the timeout
+                connection.send(("stop",))
+                GLib.timeout_add(self._timeout, self._on_stop_timeout, process)
+            except OSError:
+                graceful = False
+
+        if not graceful:
+            process.kill()
+
+        # the child is reaped from the main loop once it exits
+        GLib.io_add_watch(
+            process.sentinel, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP, self._on_exit, process, connection
+        )
+
+    def _on_stop_timeout(self, process: multiprocessing.Process) -> bool:
+        if process.is_alive():
+            logger.warning("action=kill plugin=%s timeout=%d", self._info.name, self._timeout)
+            process.kill()
+        return GLib.SOURCE_REMOVE
+
+    @staticmethod
+    def _on_exit(_fd, _condition, process: multiprocessing.Process, connection: Connection) -> bool:
+        process.join()
+        connection.close()
+        return GLib.SOURCE_REMOVE
+
+    def _restart(self, reason: str) -> None:
+        self._stop()
+
+        if not self._activated:
+            return
+
+        if self._restarts >= self.MAX_RESTARTS:
+            logger.error("action=give-up plugin=%s reason=%s restarts=%d", self._info.name, reason, self._restarts)
+            self._activated = False
+            return
+
+        self._restarts += 1
+        logger.warning("action=restart plugin=%s reason=%s restarts=%d", self._info.name, reason, self._restarts)
+        self._start()
+
+    def _forward(self, event: Events, payload: Any = None) -> None:
+        request = next(self._requests)
+        try:
+            self._connection.send(("event", request, event, payload))
+        except OSError:
+            self._restart("broken pipe")
+            return
+
+        self._pending[request] = GLib.timeout_add(self._timeout, self._on_timeout, request, event)
+
+    def _on_timeout(self, request: int, event: Events) -> bool:
+        logger.warning("action=timeout plugin=%s event=%s timeout=%d", self._info.name, event, self._timeout)
+        self._pending.pop(request, None)
+        self._restart("timeout")
+        return GLib.SOURCE_REMOVE
+
+    def _on_message(self, _fd, _condition) -> bool:
+        try:
+            # a failed plugin stops the child while its messages are read
+            while self._connection is not None and self._connection.poll():
+                self._receive(*self._connection.recv())
+        except (EOFError, OSError):
+            # the child closed the pipe, it crashed or exited
+            self._watch = 0
+            self._restart("exited")
+            return GLib.SOURCE_REMOVE
+
+        return GLib.SOURCE_CONTINUE if self._watch else GLib.SOURCE_REMOVE
+
+    def _receive(self, kind: str, *args) -> None:
+        if kind == "ready":
+            self._events = tuple(event for event in args[0] if event not in self.LOCAL_EVENTS)
+            for event in self._events:
+                self.bus.connect(event, self._forward)
+
+        elif kind == "result":
+            request, results = args
+            self._answered(request)
+            self._restarts = 0
+            logger.debug("action=result plugin=%s request=%d results=%s", self._info.name, request, results)
+
+        elif kind == "error":
+            request, error = args
+            self._answered(request)
+            logger.error("action=error plugin=%s request=%d error=%s", self._info.name, request, error)
+
+        elif kind == "failed":
+            # the module does not load, starting it again does not help
+            logger.error("action=failed plugin=%s error=%s", self._info.name, args[0])
+            self._info.error = args[0]
+            self._activated = False
+            self._stop()
+
+    def _answered(self, request: int) -> None:
+        # the request is gone when its timeout already fired
+        source = self._pending.pop(request, 0)
+        if source:
+            GLib.source_remove(source)
+
+
+def serve(connection: Connection, name: str, filepath: str, level: int) -> None:
+    """
+    Child process entry point, activates the plugin and sends it the events read from the connection.
+    """
+    logging.basicConfig(level=level, format="%(levelname)s:%(asctime)s:%(name)s:%(message)s")
+
+    bus = Bus()
+    config = Config(bus)
+    config.watch()
+    graph = Graph()
+    graph.register_instance(Graph, graph)
+    graph.register_instance("tomate.bus", bus)
+    graph.register_instance("tomate.config", config)
+
+    info = PluginInfo(name, filepath)
+    plugin = LazyPlugin(info, filepath, Plugin)
+    plugin.configure(bus, graph)
+    try:
+        plugin.activate()
+    except Exception:
+        connection.send(("failed", traceback.format_exc()))
+        return
+    if info.error is not None:
+        connection.send(("failed", "".join(traceback.format_exception(*info.error))))
+        return
+
+    connection.send(("ready", tuple(event for event in Events if bus.has_receivers(event))))
+
+    loop = GLib.MainLoop()
+
+    def on_message(_fd, _condition) -> bool:
+        try:
+            while connection.poll():
+                message = connection.recv()
+                if message[0] == "stop":
+                    plugin.deactivate()
+                    loop.quit()
+                    return GLib.SOURCE_REMOVE
+
+                _, request, event, payload = message
+                connection.send(handle(bus, request, event, payload))
+        except (EOFError, OSError):
+            loop.quit()
+            return GLib.SOURCE_REMOVE
+
+        return GLib.SOURCE_CONTINUE
+
+    GLib.io_add_watch(connection.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP, on_message)
+    loop.run()
+    # the options set by the plugin are not lost with the pending write
+    config.flush()
+
+
+def handle(bus: Bus, request: int, event: Events, payload: Any) -> Tuple[Any, ...]:
+    try:
+        results = bus.send(event, payload)
+    except Exception:
+        # raised by the plugin, the app logs the traceback
+        return "error", request, traceback.format_exc()
+
+    try:
+        pickle.dumps(results)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        logger.debug("action=repr-results event=%s", event, exc_info=True)
+        results = [repr(result) for result in results]
+
+    return "result", request, results
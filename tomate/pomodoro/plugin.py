@@ -1,14 +1,25 @@
+import inspect
+import json
 import logging
 import os
-from typing import List, Optional, Union
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent import futures
+from types import ModuleType
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
 
 import wrapt
-from gi.repository import Gtk
+from gi.repository import Gio, GLib, Gtk
 from wiring import Graph, SingletonScope, inject
 from wiring.scanning import register
+from yapsy import PLUGIN_NAME_FORBIDEN_STRING, NormalizePluginNameForModuleName
 from yapsy.ConfigurablePluginManager import ConfigurablePluginManager
 from yapsy.IPlugin import IPlugin
+from yapsy.PluginFileLocator import PluginFileLocator
 from yapsy.PluginInfo import PluginInfo
+from yapsy.PluginManager import PluginManager
 from yapsy.VersionedPluginManager import VersionedPluginManager
 
 from .config import Config
@@ -41,23 +52,419 @@ class Plugin(IPlugin, Subscriber):
         return None
 
 
+class LazyPlugin:
+    """
+    Stands for a plugin whose module is not imported yet. The metadata comes from the .plugin file, the module is
+    imported when the plugin is activated or when any other attribute is needed.
+    """
+
+    def __init__(self, info: PluginInfo, filepath: str, interface: type):
+        self._info = info
+        self._filepath = filepath
+        self._interface = interface
+        self._plugin: Optional[Plugin] = None
+        self._module: Optional[futures.Future] = None
+        self.bus = None
+        self.graph = None
+
+    def configure(self, bus: Bus, graph: Graph) -> None:
+        self.bus = bus
+        self.graph = graph
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._plugin is not None
+
+    @property
+    def is_activated(self) -> bool:
+        return self._plugin is not None and self._plugin.is_activated
+
+    @property
+    def has_settings(self) -> bool:
+        if self._plugin is not None:
+            return self._plugin.has_settings
+        return self._info.details.getboolean("Documentation", "HasSettings", fallback=False)
+
+    def activate(self) -> None:
+        plugin = self.load()
+        if plugin is not None:
+            plugin.activate()
+
+    def deactivate(self) -> None:
+        if self._plugin is not None:
+            self._plugin.deactivate()
+
+    def owns(self, path: str) -> bool:
+        return path == self._filepath + ".py" or path.startswith(self._filepath + os.sep)
+
+    def unload(self) -> Optional[str]:
+        """
+        Deactivates the plugin and forgets its module, the next load imports the module again. Returns the name of
+        the forgotten module.
+        """
+        self.deactivate()
+
+        module = type(self._plugin).__module__ if self._plugin is not None else None
+        if module is not None:
+            sys.modules.pop(module, None)
+
+        self._plugin = None
+        self._module = None
+        self._info.error = None
+        return module
+
+    def prefetch(self, executor: futures.Executor) -> futures.Future:
+        # only the import runs in the executor, the plugin is created on the main thread
+        if self._module is None:
+            self._module = executor.submit(self._import_module)
+        return self._module
+
+    def load(self) -> Optional[Plugin]:
+        if self._plugin is None and self._info.error is None:
+            try:
+                module = self._module.result() if self._module is not None else self._import_module()
+                self._plugin = self._instantiate(module)
+            except Exception:
+                logger.error("action=import plugin=%s", self._info.name, exc_info=True)
+                self._info.error = sys.exc_info()
+                return None
+
+            self._plugin.configure(self.bus, self.graph)
+
+        return self._plugin
+
+    def _import_module(self) -> ModuleType:
+        logger.debug("action=import plugin=%s path=%s", self._info.name, self._filepath)
+
+        # same module names as yapsy
+        template = NormalizePluginNameForModuleName("yapsy_loaded_plugin_" + self._info.name) + "_%d"
+        module_name = next(template % n for n in range(len(sys.modules) + 1) if template % n not in sys.modules)
+        return PluginManager._importModule(module_name, self._filepath)
+
+    def _instantiate(self, module: ModuleType) -> Plugin:
+        # same rule as yapsy, the class can be imported from another module
+        candidates = [
+            element
+            for _, element in inspect.getmembers(module, inspect.isclass)
+            if issubclass(element, self._interface) and element is not self._interface
+        ]
+        # an imported base class is a candidate too, the most derived class is the plugin
+        for candidate in candidates:
+            if not any(other is not candidate and issubclass(other, candidate) for other in candidates):
+                return candidate()
+
+        raise ImportError("plugin class not found in %s" % self._filepath)
+
+    def __getattr__(self, attr):
+        # the settings window, the event handlers and the other plugin attributes need the module
+        if attr.startswith("__") or "_plugin" not in self.__dict__ or self.load() is None:
+            raise AttributeError(attr)
+        return getattr(self._plugin, attr)
+
+
+class PluginIndex:
+    """
+    Keeps the plugins found in each plugin directory on disk. They are reused while the walked directories and the
+    .plugin files keep their mtimes and sizes, otherwise the directory is walked and its .plugin files parsed again.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self._path = path
+        self._places: Dict[str, Any] = self._read()
+        self._changed = False
+
+    def get(self, place: str) -> Optional[Dict[str, Any]]:
+        entry = self._places.get(place)
+        if entry is None:
+            return None
+
+        # a new, removed or renamed file changes the directory mtime, an edited file its own
+        if any(self._stat(path) != value for path, value in entry["stats"].items()):
+            return None
+
+        return entry
+
+    def put(self, place: str, entry: Dict[str, Any]) -> None:
+        self._places[place] = entry
+        self._changed = True
+
+    @staticmethod
+    def _stat(path: str) -> List[int]:
+        try:
+            stat = os.stat(path)
+            return [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            return []
+
+    def stats(self, place: str, files: List[str]) -> Dict[str, List[int]]:
+        directories = [place]
+        for dirpath, dirnames, _ in os.walk(place, followlinks=True):
+            # the byte code written when a plugin is imported doesn't change the plugins
+            dirnames[:] = [dirname for dirname in dirnames if dirname != "__pycache__"]
+            directories.extend(os.path.join(dirpath, dirname) for dirname in dirnames)
+        return {path: self._stat(path) for path in directories + files}
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        logger.debug("action=save-index path=%s", self._path)
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(self._path))
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"version": self.VERSION, "places": self._places}, f)
+                os.replace(temp_path, self._path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError:
+            # the index is only a shortcut, the plugins are parsed again on the next launch
+            logger.warning("action=save-index path=%s", self._path, exc_info=True)
+
+        self._changed = False
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self._path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(index, dict) or index.get("version") != self.VERSION:
+            return {}
+
+        return index.get("places", {})
+
+
+class IndexedPluginFileLocator(PluginFileLocator):
+    """
+    Takes the plugins of a directory from the index when it is up to date, only the changed directories are walked
+    and parsed as yapsy does.
+    """
+
+    def __init__(self, index: PluginIndex):
+        super().__init__()
+        self._index = index
+
+    def locatePlugins(self):
+        places = self.plugins_places
+        candidates = []
+        try:
+            for place in map(os.path.abspath, places):
+                entry = self._index.get(place)
+                if entry is None:
+                    entry = self._walk(place)
+                    self._index.put(place, entry)
+                candidates.extend(self._candidates(entry))
+        finally:
+            self.plugins_places = places
+
+        self._index.save()
+        return candidates, len(candidates)
+
+    def _walk(self, place: str) -> Dict[str, Any]:
+        logger.debug("action=walk dir=%s", place)
+        discovered = dict(self._discovered_plugins)
+        self.plugins_places = [place]
+        found, _ = super().locatePlugins()
+
+        candidates = []
+        for infofile, filepath, plugin_info in found:
+            parser = plugin_info.details
+            details = {section: dict(parser.items(section, raw=True)) for section in parser.sections()}
+            candidates.append([infofile, filepath, plugin_info.name, plugin_info.path, details])
+
+        return {
+            "stats": self._index.stats(place, [candidate[0] for candidate in candidates]),
+            "candidates": candidates,
+            "discovered": {path: value for path, value in self._discovered_plugins.items() if path not in discovered},
+        }
+
+    def _candidates(self, entry: Dict[str, Any]) -> List[Tuple[str, str, PluginInfo]]:
+        self._discovered_plugins.update(entry["discovered"])
+
+        candidates = []
+        for infofile, filepath, name, path, details in entry["candidates"]:
+            plugin_info = self._default_plugin_info_cls(name, path)
+            # fills the parser PluginInfo creates, a second parser costs as much as reading the file again
+            plugin_info.details.read_dict(details)
+            candidates.append((infofile, filepath, plugin_info))
+        return candidates
+
+
+class LazyPluginManager(PluginManager):
+    """
+    Collects the plugins from their .plugin files without importing their modules.
+    """
+
+    CATEGORY = "Default"
+    # runs the plugins that allow it in child processes
+    isolate = False
+
+    def loadPlugins(self, callback=None, callback_after=None) -> List[PluginInfo]:
+        # the host module imports this one
+        from .host import IsolatedPlugin
+
+        if not hasattr(self, "_candidates"):
+            raise ValueError("locatePlugins must be called before loadPlugins")
+
+        processed = []
+        for candidate_infofile, candidate_filepath, info in self._candidates:
+            if callback is not None:
+                callback(info)
+
+            if candidate_filepath.endswith(".py"):
+                candidate_filepath = candidate_filepath[:-3]
+            if "__init__" in os.path.basename(candidate_filepath):
+                candidate_filepath = os.path.dirname(candidate_filepath)
+
+            info.icon = info.details.get("Documentation", "Icon", fallback="tomate-plugin")
+            if self.isolate and IsolatedPlugin.accepts(info):
+                info.plugin_object = IsolatedPlugin(info, candidate_filepath)
+            else:
+                info.plugin_object = LazyPlugin(info, candidate_filepath, self.categories_interfaces[self.CATEGORY])
+            info.categories.append(self.CATEGORY)
+            self.category_mapping[self.CATEGORY].append(info)
+            self._category_file_mapping[self.CATEGORY].append(candidate_infofile)
+            processed.append(info)
+
+            if callback_after is not None:
+                callback_after(info)
+
+        delattr(self, "_candidates")
+        return processed
+
+
 @register.factory("tomate.plugin", scope=SingletonScope)
 class PluginEngine:
+    """
+    The enabled plugins are imported in a thread pool and activated on the main thread in the configured order. The
+    startup waits for them up to STARTUP_BUDGET milliseconds, the late ones are activated from the main loop.
+    """
+
+    STARTUP_BUDGET = 300
+    MAX_WORKERS = 4
+    HOST_SECTION = "plugin_host"
+
     @inject(bus="tomate.bus", config="tomate.config", graph=Graph)
     def __init__(self, bus: Bus, config: Config, graph: Graph):
         self._bus = bus
         self._graph = graph
+        self._config = config
+        self._collected = False
+        self._pending: Deque[Tuple[str, futures.Future]] = deque()
+        self._monitors: List[Gio.FileMonitor] = []
 
         logger.debug("action=init paths=%s", config.plugin_paths())
-        self._plugin_manager = ConfigurablePluginManager(decorated_manager=VersionedPluginManager())
+        # the versioned manager loads the plugins without activating the enabled ones
+        locator = IndexedPluginFileLocator(PluginIndex(config.cache_path("plugins.json")))
+        lazy_manager = LazyPluginManager(plugin_locator=locator)
+        lazy_manager.isolate = config.get_bool(self.HOST_SECTION, "enabled", fallback=False)
+        self._versioned_manager = VersionedPluginManager(decorated_manager=lazy_manager)
+        self._plugin_manager = ConfigurablePluginManager(decorated_manager=self._versioned_manager)
         self._plugin_manager.setPluginPlaces(config.plugin_paths())
         self._plugin_manager.setPluginInfoExtension("plugin")
         self._plugin_manager.setConfigParser(config.parser, config.save)
 
-    def collect(self) -> None:
+    def prefetch(self) -> None:
+        if self._collected:
+            return
+
         logger.debug("action=collect")
+        self._collected = True
         self._plugin_manager.locatePlugins()
-        self._plugin_manager.loadPlugins(callback_after=self._configure_plugin)
+        self._versioned_manager.loadPlugins(callback_after=self._configure_plugin)
+
+        enabled = [plugin for plugin in map(self.lookup, self._enabled()) if plugin is not None]
+        if enabled:
+            executor = futures.ThreadPoolExecutor(
+                max_workers=min(self.MAX_WORKERS, len(enabled)), thread_name_prefix="tomate-plugin"
+            )
+            for plugin in enabled:
+                self._pending.append((plugin.name, plugin.plugin_object.prefetch(executor)))
+            # the workers finish the submitted imports and exit
+            executor.shutdown(wait=False)
+
+    def collect(self, budget: Optional[int] = None) -> None:
+        self.prefetch()
+
+        budget = self.STARTUP_BUDGET if budget is None else budget
+        deadline = time.monotonic() + budget / 1000
+        while self._pending:
+            futures.wait([self._pending[0][1]], timeout=max(deadline - time.monotonic(), 0))
+            if not self._pending[0][1].done():
+                break
+            self._activate_ready()
+
+        if self._pending:
+            logger.debug("action=defer plugins=%s budget=%d", [name for name, _ in self._pending], budget)
+            for _, future in self._pending:
+                future.add_done_callback(lambda _: GLib.idle_add(self._activate_ready))
+
+    def watch(self) -> None:
+        """
+        Watches the plugin directories and the package directories inside them. A directory created after this
+        call is not watched until the app restarts.
+        """
+        for place in self._config.plugin_paths():
+            for path, dirs, _ in os.walk(place):
+                dirs[:] = [name for name in dirs if name != "__pycache__"]
+                logger.debug("action=watch path=%s", path)
+                monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+                monitor.connect("changed", self._on_plugin_file_changed)
+                self._monitors.append(monitor)
+
+    def _on_plugin_file_changed(
+        self, _monitor, file: Gio.File, other_file: Optional[Gio.File], event: Gio.FileMonitorEvent
+    ) -> None:
+        # a new file sends CREATED and then CHANGES_DONE_HINT, the editors that save to a temporary file rename it
+        if event in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.MOVED_IN):
+            path = file.get_path()
+        elif event == Gio.FileMonitorEvent.RENAMED:
+            path = other_file.get_path()
+        else:
+            return
+
+        for plugin in self.all():
+            # the plugins not imported yet read the new module when they are activated
+            if plugin.plugin_object.owns(path) and (plugin.plugin_object.is_loaded or plugin.error is not None):
+                self.reload(plugin.name)
+
+    def reload(self, name: str) -> bool:
+        """
+        Deactivates the plugin, disconnects whatever its module left connected to the bus, imports the module again
+        and activates the new plugin when the old one was active.
+        """
+        plugin = self.lookup(name)
+        if plugin is None:
+            return False
+
+        # the configurable manager is left out, the plugin stays in the enabled ones
+        activated = plugin.is_activated or (plugin.error is not None and name in self._enabled())
+        module = plugin.plugin_object.unload()
+        if module is not None:
+            stale = self._bus.disconnect_module(module)
+            logger.debug("action=reload plugin=%s module=%s stale=%d", name, module, stale)
+
+        if activated:
+            plugin.plugin_object.activate()
+        return plugin.error is None
+
+    def _activate_ready(self) -> bool:
+        # keeps the configured order, a plugin waits for the imports of the plugins before it
+        while self._pending and self._pending[0][1].done():
+            name, _ = self._pending.popleft()
+            self.activate(name)
+
+        return GLib.SOURCE_REMOVE
+
+    def _enabled(self) -> List[str]:
+        option = "%s_plugins_to_load" % LazyPluginManager.CATEGORY
+        names = self._config.parser.get(ConfigurablePluginManager.CONFIG_SECTION_NAME, option, fallback="")
+        return [name for name in names.strip(" ").split(PLUGIN_NAME_FORBIDEN_STRING) if name]
 
     def _configure_plugin(self, plugin: PluginInfo) -> None:
         if plugin.error is None:
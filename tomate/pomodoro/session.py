@@ -3,6 +3,7 @@ from __future__ import annotations
 import enum
 import logging
 from collections import namedtuple
+from typing import Dict
 
 from wiring import SingletonScope, inject
 from wiring.scanning import register
@@ -64,6 +65,7 @@ class Session(Subscriber):
         self.state = State.INITIAL
         self.current = Type.POMODORO
         self.pomodoros = 0
+        self._durations: Dict[Type, int] = {}
         self.connect(bus)
 
     @fsm(source=[State.INITIAL], target=State.STOPPED, exit=lambda self: self._trigger(Events.SESSION_READY))
@@ -100,9 +102,10 @@ class Session(Subscriber):
 
     @on(Events.CONFIG_CHANGE)
     def _on_config_change(self, payload: ConfigPayload) -> bool:
-        if payload.section != "timer":
+        if not payload.touches(self._config.DURATION_SECTION):
             return False
 
+        self._durations.clear()
         return self.change(self.current)
 
     @fsm(source=[State.STOPPED, State.ENDED], target="self", exit=lambda self: self._trigger(Events.SESSION_CHANGE))
@@ -113,8 +116,13 @@ class Session(Subscriber):
 
     @property
     def duration(self) -> int:
-        minutes = self._config.get_int(self._config.DURATION_SECTION, self.current.option)
-        return int(minutes * SECONDS_IN_A_MINUTE)
+        # read on every transition, the config is parsed again only after the timer section changes
+        try:
+            return self._durations[self.current]
+        except KeyError:
+            minutes = self._config.get_int(self._config.DURATION_SECTION, self.current.option)
+            duration = self._durations[self.current] = int(minutes * SECONDS_IN_A_MINUTE)
+            return duration
 
     def timer_is_up(self) -> bool:
         return not self._timer.is_running()
@@ -138,7 +146,7 @@ class Session(Subscriber):
         logger.debug("action=end previous=%s current=%s", payload.type, self.current)
 
         self.state = State.ENDED
-        self._bus.send(Events.SESSION_END, payload=payload._replace(pomodoros=self.pomodoros))
+        self._bus.emit(Events.SESSION_END, payload=payload._replace(pomodoros=self.pomodoros))
 
         return True
 
@@ -150,7 +158,7 @@ class Session(Subscriber):
         return not self.pomodoros % long_break_interval
 
     def _trigger(self, event: Events) -> None:
-        self._bus.send(event, payload=self._create_payload())
+        self._bus.emit(event, payload=self._create_payload())
 
     def _create_payload(self, **kwargs) -> Payload:
         defaults = {
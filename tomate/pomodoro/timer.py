@@ -1,34 +1,71 @@
 import enum
 import logging
-from collections import namedtuple
+import time
+from typing import List, Tuple
 
 from gi.repository import GLib
 from wiring import SingletonScope, inject
 from wiring.scanning import register
 
+from .config import Config
 from .event import Bus, Events
 from .fsm import fsm
 
 logger = logging.getLogger(__name__)
 SECONDS_IN_A_MINUTE = 60
+SECONDS_IN_AN_HOUR = 60 * SECONDS_IN_A_MINUTE
+MILLISECONDS_IN_A_SECOND = 1000
+# boot time falls back to the monotonic clock where it is not available
+CLOCK_BOOTTIME = getattr(time, "CLOCK_BOOTTIME", time.CLOCK_MONOTONIC)
+# countdown strings indexed by seconds, grows one hour at a time on demand up to _COUNTDOWN_LIMIT
+_COUNTDOWN: List[str] = []
+# longer durations are rare, they are formatted on every call instead of growing the table
+_COUNTDOWN_LIMIT = 4 * SECONDS_IN_AN_HOUR
 
 
 def format_seconds(seconds: int) -> str:
+    if seconds < 0 or seconds >= _COUNTDOWN_LIMIT:
+        return _format_seconds(seconds)
+
+    if seconds >= len(_COUNTDOWN):
+        hours = seconds // SECONDS_IN_AN_HOUR + 1
+        _COUNTDOWN.extend(_format_seconds(second) for second in range(len(_COUNTDOWN), hours * SECONDS_IN_AN_HOUR))
+
+    return _COUNTDOWN[seconds]
+
+
+def _format_seconds(seconds: int) -> str:
     minutes, seconds = divmod(seconds, SECONDS_IN_A_MINUTE)
     return "{0:0>2}:{1:0>2}".format(minutes, seconds)
 
 
-class Payload(namedtuple("TimerPayload", ["time_left", "duration"])):
+class Payload:
+    """
+    Timer event payload, one instance is shared by all the receivers of an event. The derived fields are computed on
+    first access and cached, so the countdown is formatted once per tick no matter how many receivers read it.
+
+    progress is the elapsed fraction of the duration with the timer interval resolution.
+    """
+
+    __slots__ = ("time_left", "duration", "progress", "_remaining_ratio", "_elapsed_ratio", "_countdown")
+
+    def __init__(self, time_left: int, duration: int, progress: float = 0.0):
+        self.time_left = time_left
+        self.duration = duration
+        self.progress = progress
+        self._remaining_ratio = self._elapsed_ratio = self._countdown = None
+
     @property
     def remaining_ratio(self) -> float:
-        try:
-            return self.time_left / self.duration
-        except ZeroDivisionError:
-            return 0.0
+        if self._remaining_ratio is None:
+            self._remaining_ratio = self.time_left / self.duration if self.duration else 0.0
+        return self._remaining_ratio
 
     @property
     def elapsed_ratio(self) -> float:
-        return round(1.0 - self.remaining_ratio, 2)
+        if self._elapsed_ratio is None:
+            self._elapsed_ratio = round(1.0 - self.remaining_ratio, 2)
+        return self._elapsed_ratio
 
     @property
     def elapsed_percent(self):
@@ -40,7 +77,22 @@ class Payload(namedtuple("TimerPayload", ["time_left", "duration"])):
 
     @property
     def countdown(self) -> str:
-        return format_seconds(self.time_left)
+        if self._countdown is None:
+            self._countdown = format_seconds(self.time_left)
+        return self._countdown
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Payload):
+            return NotImplemented
+        return (self.time_left, self.duration, self.progress) == (other.time_left, other.duration, other.progress)
+
+    def __hash__(self) -> int:
+        return hash((self.time_left, self.duration, self.progress))
+
+    def __repr__(self) -> str:
+        return "TimerPayload(time_left={}, duration={}, progress={})".format(
+            self.time_left, self.duration, self.progress
+        )
 
 
 # Based on Tomatoro create by Pierre Quillery.
@@ -54,21 +106,76 @@ class State(enum.Enum):
     ENDED = 3
 
 
+class Clock:
+    """
+    The monotonic clock stops while the system is suspended, the boot time clock keeps counting.
+    """
+
+    @staticmethod
+    def monotonic() -> float:
+        return time.monotonic()
+
+    @staticmethod
+    def boottime() -> float:
+        return time.clock_gettime(CLOCK_BOOTTIME)
+
+
 @register.factory("tomate.timer", scope=SingletonScope)
 class Timer:
+    """
+    Counts down to a deadline taken from the boot time clock. Each wake up computes time_left from the clock and
+    re-arms the timeout to the next tick before the deadline, so late callbacks never extend the session.
+
+    When the system sleeps the gap between the clocks is detected on the next wake up. With catch_up, the default, the
+    sleep counts as session time and time_left jumps forward in one step, otherwise the deadline is pushed back by
+    the sleep.
+
+    While nobody receives TIMER_UPDATE the timer only wakes up at the deadline, or once a minute to notice a suspend.
+    Otherwise it sends a TIMER_UPDATE every interval milliseconds, aligned to the deadline. The interval and catch_up
+    options are read from the timer section when the timer starts.
+    """
+
     ONE_SECOND = 1
+    # difference between the clocks ignored as jitter
+    SUSPEND_THRESHOLD = MILLISECONDS_IN_A_SECOND
+    IDLE_WAKE_UP = SECONDS_IN_A_MINUTE * MILLISECONDS_IN_A_SECOND
+    INTERVAL_OPTION = "interval"
+    CATCH_UP_OPTION = "catch_up"
+    # shorter intervals wake up the process more often than a redraw is worth
+    MIN_INTERVAL = 100
 
-    @inject(bus="tomate.bus")
-    def __init__(self, bus: Bus):
+    @inject(bus="tomate.bus", config="tomate.config")
+    def __init__(
+        self,
+        bus: Bus,
+        config: Config,
+        clock: Clock = Clock(),
+    ):
         self.duration = self.time_left = 0
         self.state = State.STOPPED
+        self.catch_up = True
+        self.interval = MILLISECONDS_IN_A_SECOND
         self._bus = bus
+        self._config = config
+        self._clock = clock
+        self._deadline = self._remaining = self._tick = 0
+        self._last_wake_up = (0, 0)
+        self._source = 0
 
     @fsm(target=State.STARTED, source=[State.ENDED, State.STOPPED], exit=lambda self: self._trigger(Events.TIMER_START))
     def start(self, seconds: int) -> bool:
         logger.debug("action=start")
+        self.interval = max(
+            self._config.get_int(Config.DURATION_SECTION, self.INTERVAL_OPTION, fallback=MILLISECONDS_IN_A_SECOND),
+            self.MIN_INTERVAL,
+        )
+        self.catch_up = self._config.get_bool(Config.DURATION_SECTION, self.CATCH_UP_OPTION, fallback=True)
         self.duration = self.time_left = seconds
-        GLib.timeout_add_seconds(Timer.ONE_SECOND, self._update, priority=GLib.PRIORITY_HIGH)
+        self._remaining = seconds * MILLISECONDS_IN_A_SECOND
+        self._tick = -(-self._remaining // self.interval)
+        self._last_wake_up = self._now()
+        self._deadline = self._last_wake_up[1] + self._remaining
+        self._schedule(self._remaining)
         return True
 
     @fsm(target=State.STOPPED, source=[State.STARTED], exit=lambda self: self._trigger(Events.TIMER_STOP))
@@ -91,20 +198,81 @@ class Timer:
         return True
 
     def _update(self) -> bool:
-        logger.debug("action=update time_left=%d duration=%d", self.time_left, self.duration)
+        self._source = 0
 
         if self.state != State.STARTED:
-            return False
+            return GLib.SOURCE_REMOVE
+
+        monotonic, boottime = self._now()
+        slept = (boottime - self._last_wake_up[1]) - (monotonic - self._last_wake_up[0])
+        self._last_wake_up = (monotonic, boottime)
+
+        if slept > self.SUSPEND_THRESHOLD:
+            logger.debug("action=resume slept=%d catch_up=%s", slept, self.catch_up)
+            if not self.catch_up:
+                self._deadline += slept
+
+        remaining = max(self._deadline - boottime, 0)
+        tick = -(-remaining // self.interval)
+        logger.debug("action=update remaining=%d duration=%d", remaining, self.duration)
+
+        # an early wake up can land in the same tick, waits for the next one
+        if tick != self._tick:
+            self._tick = tick
+            self._remaining = remaining
+            self.time_left = -(-remaining // MILLISECONDS_IN_A_SECOND)
+            self._trigger(Events.TIMER_UPDATE)
 
         if self._is_up():
-            return self.end()
+            self.end()
+        else:
+            self._schedule(remaining)
 
-        self.time_left -= 1
-        self._trigger(Events.TIMER_UPDATE)
-        return True
+        return GLib.SOURCE_REMOVE
+
+    def refresh(self, notify: bool = True) -> None:
+        """
+        Re-arms the timeout after the TIMER_UPDATE receivers changed. With notify the current state is sent even when
+        the tick did not change, so new receivers don't wait for the next tick.
+        """
+        if self.state == State.STARTED:
+            self._cancel()
+            if notify:
+                self._tick = -1
+            self._update()
+
+    def _schedule(self, remaining: int) -> None:
+        if self._bus.has_receivers(Events.TIMER_UPDATE):
+            # wakes up at the next interval boundary before the deadline
+            delay = (remaining - 1) % self.interval + 1
+        else:
+            delay = min(remaining, self.IDLE_WAKE_UP)
+
+        self._source = GLib.timeout_add(delay, self._update, priority=GLib.PRIORITY_HIGH)
+
+    def _cancel(self) -> None:
+        if self._source:
+            GLib.source_remove(self._source)
+            self._source = 0
+
+    def _now(self) -> Tuple[int, int]:
+        return (
+            int(self._clock.monotonic() * MILLISECONDS_IN_A_SECOND),
+            int(self._clock.boottime() * MILLISECONDS_IN_A_SECOND),
+        )
 
     def _reset(self) -> None:
+        self._cancel()
         self.duration = self.time_left = 0
+        self._deadline = self._remaining = self._tick = 0
+        self._last_wake_up = (0, 0)
+
+    def _progress(self) -> float:
+        total = self.duration * MILLISECONDS_IN_A_SECOND
+        return (total - self._remaining) / total if total else 0.0
 
     def _trigger(self, event) -> None:
-        self._bus.send(event, payload=Payload(time_left=self.time_left, duration=self.duration))
+        self._bus.emit(
+            event,
+            payload=Payload(time_left=self.time_left, duration=self.duration, progress=self._progress()),
+        )
@@ -1,27 +1,72 @@
 import logging
-from typing import Union
+from typing import Dict, Union
 
 from gi.repository import Gtk
 from wiring import SingletonScope, inject
 from wiring.scanning import register
 
-from tomate.pomodoro import Bus, Events, SessionPayload, Subscriber, TimerPayload, on
+from tomate.pomodoro import (
+    Bus,
+    Events,
+    Priority,
+    SessionPayload,
+    Subscriber,
+    Timer,
+    TimerPayload,
+    on,
+)
 
 logger = logging.getLogger(__name__)
+# markup by countdown text, each text is formatted once
+_MARKUP: Dict[str, str] = {}
 
 
 @register.factory("tomate.ui.countdown", scope=SingletonScope)
 class Countdown(Subscriber):
-    @inject(bus="tomate.bus")
-    def __init__(self, bus: Bus):
+    @inject(bus="tomate.bus", timer="tomate.timer")
+    def __init__(self, bus: Bus, timer: Timer):
+        self._bus = bus
+        self._timer = timer
+        self._time_left = -1
+        self._visible = True
         self.widget = Gtk.Label(margin_top=30, margin_bottom=10, margin_right=10, margin_left=10, label="00:00")
         self.connect(bus)
 
-    @on(Events.TIMER_UPDATE, Events.SESSION_READY, Events.SESSION_INTERRUPT, Events.SESSION_CHANGE)
+    @on(Events.SESSION_READY, Events.SESSION_INTERRUPT, Events.SESSION_CHANGE, priority=Priority.HIGH)
+    def _on_session_change(self, payload: SessionPayload) -> None:
+        self._time_left = -1
+        self._update_countdown(payload)
+
+    @on(Events.TIMER_UPDATE, priority=Priority.HIGH)
+    def _on_timer_update(self, payload: TimerPayload) -> None:
+        # sub-second ticks repeat the same second, the label only changes once a second
+        if payload.time_left != self._time_left:
+            self._time_left = payload.time_left
+            self._update_countdown(payload)
+
     def _update_countdown(self, payload: Union[SessionPayload, TimerPayload]) -> None:
         logger.debug("action=update countdown=%s", payload.countdown)
         self.widget.set_markup(self.timer_markup(payload.countdown))
 
+    def set_visible(self, visible: bool) -> None:
+        if visible == self._visible:
+            return
+
+        self._visible = visible
+        if visible:
+            logger.debug("action=resume_updates")
+            self._bus.connect(Events.TIMER_UPDATE, self._on_timer_update, priority=Priority.HIGH)
+        else:
+            # a hidden countdown doesn't need the timer updates, the timer slows down without receivers
+            logger.debug("action=pause_updates")
+            self._bus.disconnect(Events.TIMER_UPDATE, self._on_timer_update)
+
+        # the label missed the updates while it was hidden, it gets the current state right away
+        self._timer.refresh(notify=visible)
+
     @staticmethod
     def timer_markup(time_left: str) -> str:
-        return '<span face="sans-serif" font="45">{}</span>'.format(time_left)
+        markup = _MARKUP.get(time_left)
+        if markup is None:
+            markup = _MARKUP[time_left] = '<span face="sans-serif" font="45">{}</span>'.format(time_left)
+        return markup
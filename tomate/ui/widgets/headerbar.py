@@ -6,7 +6,15 @@ from gi.repository import Gtk
 from wiring import SingletonScope, inject
 from wiring.scanning import register
 
-from tomate.pomodoro import Bus, Events, Session, SessionPayload, Subscriber, on
+from tomate.pomodoro import (
+    Bus,
+    Events,
+    Priority,
+    Session,
+    SessionPayload,
+    Subscriber,
+    on,
+)
 from tomate.ui import Shortcut, ShortcutEngine
 
 locale.textdomain("tomate")
@@ -115,14 +123,14 @@ class HeaderBar(Subscriber):
         button.add(icon)
         self.widget.pack_end(button)
 
-    @on(Events.SESSION_START)
+    @on(Events.SESSION_START, priority=Priority.HIGH)
     def _on_session_start(self, **__):
         logger.debug("action=enable_stop")
         self._start_button.props.visible = False
         self._stop_button.props.visible = True
         self._reset_button.props.sensitive = False
 
-    @on(Events.SESSION_INTERRUPT, Events.SESSION_END)
+    @on(Events.SESSION_INTERRUPT, Events.SESSION_END, priority=Priority.HIGH)
     def _on_session_stop(self, payload: SessionPayload) -> None:
         logger.debug("action=enable_start pomodoros=%d", payload.pomodoros)
         self._start_button.props.visible = True
@@ -130,7 +138,7 @@ class HeaderBar(Subscriber):
         self._reset_button.props.sensitive = bool(payload.pomodoros)
         self._update_title(payload.pomodoros)
 
-    @on(Events.SESSION_RESET)
+    @on(Events.SESSION_RESET, priority=Priority.HIGH)
     def _on_session_reset(self, **__):
         logger.debug("action=disable_reset")
         self._reset_button.props.sensitive = False
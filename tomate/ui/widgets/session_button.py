@@ -9,6 +9,7 @@ from wiring.scanning import register
 from tomate.pomodoro import (
     Bus,
     Events,
+    Priority,
     Session,
     SessionPayload,
     SessionType,
@@ -76,18 +77,18 @@ class SessionButton(Subscriber):
         logger.debug("action=mode_changed session=%s", session_type)
         self._session.change(session_type)
 
-    @on(Events.SESSION_CHANGE)
+    @on(Events.SESSION_CHANGE, priority=Priority.HIGH)
     def _change(self, payload=SessionPayload) -> None:
         logger.debug("action=change current=%d next=%d", self.widget.get_selected(), payload.type.value)
         if self.widget.get_selected() != payload.type.value:
             self._enable(payload)
 
-    @on(Events.SESSION_START)
+    @on(Events.SESSION_START, priority=Priority.HIGH)
     def _disable(self, **__):
         logger.debug("action=disable")
         self.widget.props.sensitive = False
 
-    @on(Events.SESSION_READY, Events.SESSION_INTERRUPT)
+    @on(Events.SESSION_READY, Events.SESSION_INTERRUPT, priority=Priority.HIGH)
     def _enable(self, payload: SessionPayload):
         logger.debug("action=enable session=%s", payload.type)
         self.widget.props.sensitive = True
@@ -1,7 +1,7 @@
 import logging
 import time
 
-from gi.repository import GdkPixbuf, Gtk
+from gi.repository import Gdk, GdkPixbuf, Gtk
 from wiring import Graph, SingletonScope, inject
 from wiring.scanning import register
 
@@ -39,8 +39,12 @@ class Window(Subscriber):
     ):
         self._session = session
         self._bus = bus
+        self._config = config
         self._graph = graph
+        self._countdown = countdown
+        self._mapped = self._iconified = False
         self.connect(bus)
+        Gtk.IconTheme.get_default().connect("changed", self._on_icon_theme_changed)
 
         content = self._create_content(countdown, session_button)
         self.widget = self._create_window(config, headerbar, content)
@@ -58,6 +62,9 @@ class Window(Subscriber):
         window.set_size_request(350, -1)
         window.set_titlebar(headerbar.widget)
         window.connect("delete-event", self.quit)
+        window.connect("map", self._on_map, True)
+        window.connect("unmap", self._on_map, False)
+        window.connect("window-state-event", self._on_window_state)
         window.add(box)
         return window
 
@@ -67,6 +74,23 @@ class Window(Subscriber):
         box.pack_start(session_button.widget, False, False, 0)
         return box
 
+    def _on_map(self, _widget, mapped: bool) -> None:
+        self._mapped = mapped
+        self._update_visibility()
+
+    def _on_window_state(self, _widget, event: Gdk.EventWindowState) -> bool:
+        # the window can be restored from the taskbar without passing through show
+        self._iconified = bool(event.new_window_state & Gdk.WindowState.ICONIFIED)
+        self._update_visibility()
+        return False
+
+    def _update_visibility(self) -> None:
+        self._countdown.set_visible(self._mapped and not self._iconified)
+
+    def _on_icon_theme_changed(self, *_) -> None:
+        logger.debug("action=icon_theme_changed")
+        self._config.clear_cache()
+
     def run(self) -> None:
         logger.debug("action=run")
         self.widget.show_all()
@@ -80,7 +104,7 @@ class Window(Subscriber):
             Gtk.main_quit()
 
     def hide(self):
-        self._bus.send(Events.WINDOW_HIDE)
+        self._bus.emit(Events.WINDOW_HIDE)
 
         if Systray in self._graph.providers:
             logger.debug("action=hide strategy=tray")
@@ -93,5 +117,5 @@ class Window(Subscriber):
     @on(Events.SESSION_END)
     def show(self, **__) -> None:
         logger.debug("action=show")
-        self._bus.send(Events.WINDOW_SHOW)
+        self._bus.emit(Events.WINDOW_SHOW)
         self.widget.present_with_time(time.time())